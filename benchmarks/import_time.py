@@ -0,0 +1,36 @@
+'''
+    Measures the start-up cost of pyimclsts: the time to import pyimclsts.network, to load the
+    generated package (on first use) and to serialize the first message (which looks up the
+    default src address). Each measurement runs in a fresh interpreter.
+
+    Run it from a folder that contains pyimc_generated (see pyimclsts.extract):
+        $ python3 path/to/benchmarks/import_time.py [-n 10]
+'''
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+_probe = '''
+import json, time
+t0 = time.perf_counter()
+import pyimclsts.network as n
+t1 = time.perf_counter()
+n._pg.messages
+t2 = time.perf_counter()
+n._pg.messages.Heartbeat().pack()
+t3 = time.perf_counter()
+print(json.dumps({'import' : t1 - t0, 'load generated' : t2 - t1, 'first pack' : t3 - t2, 'total' : t3 - t0}))
+'''
+
+if __name__ == '__main__':
+    argparser = argparse.ArgumentParser(description='Measures the start-up time of pyimclsts.')
+    argparser.add_argument('-n', '--runs', type=int, default=10, help='Number of fresh interpreters (default: 10)')
+    args = argparser.parse_args()
+
+    results = [json.loads(subprocess.run([sys.executable, '-c', _probe], capture_output=True, check=True, text=True).stdout)
+                for _ in range(args.runs)]
+    for key in results[0]:
+        values = [r[key] * 1000 for r in results]
+        print(f'{key:>15}: median {statistics.median(values):8.1f} ms, min {min(values):8.1f} ms')
@@ -30,7 +30,12 @@ MessageAttributes = namedtuple('MessageAttributes', %MESSAGE_ATTRIBUTES%)
 
 # "Global" variables
 _sync_number = %SYNCH_NUMBER%
-_default_src = 0x4000 | (core.get_initial_IP() & 0xFFFF)
+
+def __getattr__(name : str) -> Any:
+    # _default_src used to be computed at import. It is now looked up on first use (see core.get_default_src)
+    if name == '_default_src':
+        return core.get_default_src()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
 
 # "Re-exporting" from core
 IMC_message = core.IMC_message
@@ -128,6 +133,8 @@ class base_message(IMC_message):
         return False
 
     def _pack_fields(self, *, serial_functions : dict) -> bytes:
+        '''Generic serialization of the fields. The generated message classes override it with a specialized
+        version (see extract.pack_extractor), which must behave the same.'''
         # Check if any field is empty (None) and not type 'message' (checked through the descriptor)
         if any([getattr(self, '_' + field) is None for field in self.Attributes.fields if getattr(getattr(type(self), field), '_field_def').get('type', None) != 'message']):
             raise ValueError('Cannot serialize a message that contains an empty (NoneType) field that is not a message.')
@@ -161,7 +168,7 @@ class base_message(IMC_message):
         # If None or a "default" value, overwrite
         if not hasattr(self, '_header'):
             _timestamp = time.time()
-            _src = src if src is not None else _default_src
+            _src = src if src is not None else core.get_default_src()
             _src_ent = src_ent if src_ent is not None else 0xFF
             _dst = dst if dst is not None else 0xFFFF
             _dst_ent = dst_ent if dst_ent is not None else 0xFF
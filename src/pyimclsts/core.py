@@ -17,6 +17,7 @@ import ifaddr as _ifaddr
 import ipaddress as _ipaddress
 
 import struct as _struct
+import gzip as _gzip
 import asyncio as _asyncio
 
 from typing import Any
@@ -57,6 +58,8 @@ pack_functions_little = {
 'header': _struct.Struct('<HHHdHBHB').pack # special "type"
 }
 
+# Obs: the unpack functions accept any bytes-like object (e.g. a memoryview of a mmap), but always
+# return bytes (rawdata) and str (plaintext), so that messages do not hold references to the buffer.
 unpack_functions_big = {
 'int8_t': lambda x : (_struct.Struct('>b').unpack(x[:1])[0], 1),
 'uint8_t': lambda x : (_struct.Struct('>B').unpack(x[:1])[0], 1),
@@ -67,8 +70,8 @@ unpack_functions_big = {
 'int64_t': lambda x : (_struct.Struct('>q').unpack(x[:8])[0], 8),
 'fp32_t': lambda x : (_struct.Struct('>f').unpack(x[:4])[0], 4),
 'fp64_t': lambda x : (_struct.Struct('>d').unpack(x[:8])[0], 8),
-'rawdata': lambda x : (x[2:2 + _struct.Struct('>H').unpack(x[:2])[0]], 2 + _struct.Struct('>H').unpack(x[:2])[0]),
-'plaintext': lambda x : (x[2:2 + int.from_bytes(x[:2], byteorder='big')].decode(encoding = 'ascii', errors='surrogateescape'), 2 + int.from_bytes(x[:2], byteorder='big')),
+'rawdata': lambda x : (bytes(x[2:2 + _struct.Struct('>H').unpack(x[:2])[0]]), 2 + _struct.Struct('>H').unpack(x[:2])[0]),
+'plaintext': lambda x : (bytes(x[2:2 + int.from_bytes(x[:2], byteorder='big')]).decode(encoding = 'ascii', errors='surrogateescape'), 2 + int.from_bytes(x[:2], byteorder='big')),
 'message': None,
 'message-list': None,
 'header': lambda x : (_struct.Struct('>HHHdHBHB').unpack(x[:20]), 20), # special "type"
@@ -84,8 +87,8 @@ unpack_functions_little = {
 'int64_t': lambda x : (_struct.Struct('<q').unpack(x[:8])[0], 8),
 'fp32_t': lambda x : (_struct.Struct('<f').unpack(x[:4])[0], 4),
 'fp64_t': lambda x : (_struct.Struct('<d').unpack(x[:8])[0], 8),
-'rawdata': lambda x : (x[2:2 + _struct.Struct('<H').unpack(x[:2])[0]], 2 + _struct.Struct('<H').unpack(x[:2])[0]),
-'plaintext': lambda x : (x[2:2 + int.from_bytes(x[:2], byteorder='little')].decode(encoding = 'ascii', errors='surrogateescape'), 2 + int.from_bytes(x[:2], byteorder='little')),
+'rawdata': lambda x : (bytes(x[2:2 + _struct.Struct('<H').unpack(x[:2])[0]]), 2 + _struct.Struct('<H').unpack(x[:2])[0]),
+'plaintext': lambda x : (bytes(x[2:2 + int.from_bytes(x[:2], byteorder='little')]).decode(encoding = 'ascii', errors='surrogateescape'), 2 + int.from_bytes(x[:2], byteorder='little')),
 'message': None,
 'message-list': None,
 'header': lambda x : (_struct.Struct('<HHHdHBHB').unpack(x[:20]), 20) # special "type"
@@ -143,6 +146,18 @@ def get_initial_IP() -> int:
             return int(_ipaddress.IPv4Address(ip))
     return int(_ipaddress.IPv4Address('127.0.0.1'))
 
+_default_src = None
+
+def get_default_src() -> int:
+    '''Returns the default IMC address (src) of this system: 0x4000 | the last 16 bits of its IP (see get_initial_IP).
+    
+    Since enumerating the network adapters is slow, it is computed on the first call only.
+    '''
+    global _default_src
+    if _default_src is None:
+        _default_src = 0x4000 | (get_initial_IP() & 0xFFFF)
+    return _default_src
+
 async def _async_wrapper(func, *args) -> Any:
     return func(*args)
 
@@ -199,6 +214,7 @@ class file_interface(base_IO_interface):
     '''
         A minimal implementation of a file interface. Receives an input
         file name and (optionally) an output file name, to which it appends.
+        Compressed (gzip) input files are decompressed on the fly.
     '''
     __slots__ = ['_input', '_output', '_o', '_i']
 
@@ -209,6 +225,11 @@ class file_interface(base_IO_interface):
     async def open(self) -> None:
         self._o = open(self._output, 'ab') if self._output is not None else None
         self._i = open(self._input, 'rb')
+        if self._i.read(2) == b'\x1f\x8b':
+            self._i.close()
+            self._i = _gzip.open(self._input, 'rb')
+        else:
+            self._i.seek(0)
     
     async def read(self, n_bytes : int) -> bytes:
         r = self._i.read(n_bytes)
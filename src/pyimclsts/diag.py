@@ -0,0 +1,170 @@
+'''
+    Diagnostics of pyimclsts.
+
+    startup: measures the cold start of a process that uses pyimclsts, stage by stage: importing pyimclsts.core and
+    pyimclsts.network, loading the generated package, building a subscriber, opening a message_bus (which spawns its
+    child process) and receiving and decoding the first message. Each run is executed in a fresh interpreter and the
+    report (wall time and resident memory after each stage) is printed as JSON, e.g., to track regressions of batch
+    workers:
+        $ python3 -m pyimclsts.diag startup [-n 5] [-i Data.lsf] [-o startup.json]
+
+    Run it where the workers run, that is, from a folder that contains pyimc_generated (or with PYIMCLSTS_GENERATED set,
+    see pyimclsts.network.set_generated_location). Without an input log, the message bus reads a Heartbeat from a
+    temporary one.
+
+    This module is imported by the measured interpreters, so it must only import the standard library at module level.
+'''
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+
+from typing import Optional, List, Dict, Any
+
+_stages = ['import core', 'import network', 'load generated', 'build subscriber', 'open message_bus', 'first message']
+
+def _rss() -> Optional[int]:
+    '''Resident set size of this process, in bytes, or None if it cannot be measured.'''
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # peak (not current) resident set size, in KiB on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+def _startup_probe(input : str) -> Dict[str, Dict[str, Any]]:
+    '''Executed in a fresh interpreter: runs the start-up stages, in order, and returns
+    {stage : {'time' : seconds, 'rss' : bytes after the stage}}.'''
+    results = dict()
+    def done(stage : str, t0 : float) -> None:
+        results[stage] = {'time' : time.perf_counter() - t0, 'rss' : _rss()}
+
+    t0 = time.perf_counter()
+    import pyimclsts.core
+    done('import core', t0)
+
+    t0 = time.perf_counter()
+    import pyimclsts.network as network
+    done('import network', t0)
+
+    t0 = time.perf_counter()
+    network._pg.messages
+    done('load generated', t0)
+
+    t0 = time.perf_counter()
+    network.subscriber(network.file_interface(input=input))
+    done('build subscriber', t0)
+
+    t0 = time.perf_counter()
+    bus = network.message_bus(network.file_interface(input=input), False)
+    bus.open()
+    done('open message_bus', t0)
+
+    try:
+        t0 = time.perf_counter()
+        network.unpack(bus.recv(), fast_mode=True)
+        done('first message', t0)
+    finally:
+        # Stop the child process and drain the pipe, where it may be blocked on a large log
+        with bus._keep_running.get_lock():
+            bus._keep_running.value = False
+        while bus._child_process.is_alive():
+            while bus.poll(0.05):
+                bus._parent_end.recv_bytes()
+        bus.close()
+    return results
+
+def _heartbeat_log(path : str) -> None:
+    '''Writes a log with a single Heartbeat (id 150, no fields). It is serialized by hand, so that the measuring
+    process does not load (and thus, warm up) the generated package.'''
+    import pyimclsts.core as core
+    header = struct.pack('<HHHdHBHB', 0xFE54, 150, 0, time.time(), 0x4000, 0xFF, 0xFFFF, 0xFF)
+    with open(path, 'wb') as f:
+        f.write(header + struct.pack('<H', core.CRC16IMB(header)))
+
+def _summary(values : List[float]) -> Dict[str, float]:
+    return {'median' : round(statistics.median(values), 3), 'min' : round(min(values), 3), 'max' : round(max(values), 3)}
+
+def startup(runs : int = 5, input : Optional[str] = None) -> Dict[str, Any]:
+    '''Runs the start-up probe in runs fresh interpreters and returns the report (see the module documentation).
+    Times are in milliseconds and memory in MiB.'''
+    tmp = None
+    if input is None:
+        fd, tmp = tempfile.mkstemp(suffix='.lsf')
+        os.close(fd)
+        _heartbeat_log(tmp)
+    try:
+        samples = []
+        for _ in range(runs):
+            probe = subprocess.run([sys.executable, '-m', 'pyimclsts.diag', '_probe', input if input is not None else tmp],
+                                    capture_output=True, text=True)
+            # the message bus also prints to stdout: the results are the last line
+            lines = probe.stdout.strip().splitlines()
+            if probe.returncode != 0 or not lines:
+                raise RuntimeError(f'The start-up probe failed:\n{probe.stderr}')
+            samples.append(json.loads(lines[-1]))
+    finally:
+        if tmp is not None:
+            os.remove(tmp)
+
+    stages = dict()
+    previous_rss = None
+    for stage in _stages:
+        times = [s[stage]['time'] * 1000 for s in samples]
+        rss = [s[stage]['rss'] / 2**20 for s in samples if s[stage]['rss'] is not None]
+        stages[stage] = {'time_ms' : _summary(times)}
+        if rss:
+            stages[stage]['rss_mib'] = round(statistics.median(rss), 3)
+            if previous_rss is not None:
+                stages[stage]['rss_delta_mib'] = round(statistics.median(rss) - previous_rss, 3)
+            previous_rss = statistics.median(rss)
+
+    return {'command' : 'startup',
+            'python' : platform.python_version(),
+            'platform' : platform.platform(),
+            'cpus' : os.cpu_count(),
+            'input' : input,
+            'generated' : os.environ.get('PYIMCLSTS_GENERATED', os.path.join(os.getcwd(), 'pyimc_generated')),
+            'runs' : runs,
+            'stages' : stages,
+            'total_ms' : _summary([sum(s[stage]['time'] for stage in _stages) * 1000 for s in samples]),
+            'samples' : [{stage : {'time_ms' : round(s[stage]['time'] * 1000, 3), 'rss' : s[stage]['rss']} for stage in _stages}
+                            for s in samples]}
+
+if __name__ == '__main__':
+    argparser = argparse.ArgumentParser(description='Diagnostics of pyimclsts.')
+    subparsers = argparser.add_subparsers(dest='command')
+    p = subparsers.add_parser('startup', help='Measure the start-up time and memory, as JSON')
+    p.add_argument('-n', '--runs', type=int, default=5, help='Number of fresh interpreters (default: 5)')
+    p.add_argument('-i', '--input', default=None, help='Log read by the message bus (default: a temporary one, with a Heartbeat)')
+    p.add_argument('-o', '--output', default=None, help='Write the report to this file instead of the standard output')
+    p = subparsers.add_parser('_probe')
+    p.add_argument('input')
+    args = argparser.parse_args()
+
+    if args.command == 'startup':
+        report = json.dumps(startup(args.runs, args.input), indent=2)
+        if args.output is not None:
+            with open(args.output, 'w') as f:
+                f.write(report + '\n')
+        else:
+            print(report)
+    elif args.command == '_probe':
+        results = _startup_probe(args.input)
+        sys.stdout.flush()
+        print(json.dumps(results))
+    else:
+        argparser.print_help()
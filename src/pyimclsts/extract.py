@@ -3,19 +3,34 @@
 '''
 
 from . import extractutils
+from .schema import struct_codes
 
 import xml.etree.ElementTree as ET
 import pathlib
 
 import os
-import shutil
 import argparse
 
 import urllib.request
 import ssl
 import gzip
+import re
+import io
+import json
+import copy
+import hashlib
+import contextlib
+import importlib.util
+import marshal
+import zipfile
+
+from typing import Optional
 
 _target_folder = 'pyimc_generated'
+# Stored in the target folder: parsed schema and digests of the generated files (see read_cache)
+_cache_file = '.extract_cache.json'
+# Bump when the format of the cache changes
+_cache_version = 1
 
 unknown_message = '''
 class Unknown(_base.base_message):
@@ -77,7 +92,84 @@ Provide a file as parameter, that contains a list of messages (abbrev's, one per
 minimal = {'Abort', 'EntityState', 'QueryEntityState', 'EntityInfo', 'QueryEntityInfo', 'EntityList', 'EntityActivationState', 'QueryEntityActivationState', 
            'Heartbeat', 'Announce', 'AnnounceService'}
 
-def hardcode_message_extractor(message : dict, templates_namespace : str, message_attributes : set) -> str:
+dtypes_module = """\'\'\'
+IMC numpy dtypes of the messages with a fixed layout, that is, whose fields are all numeric.
+
+A dtype describes a whole frame (header, fields and footer), so that a batch of frames of one message
+can be reinterpreted as a record array in one operation, e.g.:
+    numpy.frombuffer(frames, dtype=dtypes.get_dtype(350, big_endian=False))
+Header and footer fields are named 'header.<field>' and 'footer.crc'. numpy is only imported
+when a dtype is requested.
+\'\'\'
+
+from typing import Optional, Any
+
+_header = ##HEADER##
+_footer = ##FOOTER##
+# Message id -> fields (name, numpy type without byte order)
+_fields = ##FIELDS##
+
+# Dtypes that were already built: (message id, big endian) -> dtype
+registry = dict()
+
+def is_fixed(msg_id : int) -> bool:
+    \'\'\'Whether the layout of the given message is fixed, i.e., whether it has a dtype.\'\'\'
+    return msg_id in _fields
+
+def frame_size(msg_id : int) -> Optional[int]:
+    \'\'\'Size, in bytes, of a whole frame of the given message, or None if its layout is not fixed.\'\'\'
+    if msg_id not in _fields:
+        return None
+    return sum(int(t[1:]) for _, t in _header + _fields[msg_id] + _footer)
+
+def get_dtype(msg_id : int, big_endian : bool = True) -> Any:
+    \'\'\'Returns the (packed) numpy structured dtype of a whole frame of the given message, in the given byte order,
+    or None if its layout is not fixed.\'\'\'
+    dtype = registry.get((msg_id, big_endian), None)
+    if dtype is None and msg_id in _fields:
+        import numpy
+        e = '>' if big_endian else '<'
+        dtype = numpy.dtype([(name, e + t) for name, t in _header + _fields[msg_id] + _footer])
+        registry[(msg_id, big_endian)] = dtype
+    return dtype
+"""
+
+categories_init = """\'\'\'
+IMC message categories. Each category module is only imported when it is first used.
+\'\'\'
+
+import importlib as _importlib
+
+_categories = ##CATEGORIES##
+
+def __getattr__(name : str):
+    if name in _categories:
+        # importing a submodule also binds it to this package, so this is called only once per category
+        return _importlib.import_module('.' + name, __name__)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+def __dir__():
+    return sorted(set(globals()) | set(_categories))
+"""
+
+lazy_messages = """
+# Message abbrev -> module (in categories) where it is defined
+_message_categories = ##MESSAGE_CATEGORIES##
+
+def __getattr__(name : str):
+    \'\'\'Imports the category of a message on its first reference, so that only the used categories are loaded.\'\'\'
+    category = _message_categories.get(name, None)
+    if category is None:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    message_class = getattr(getattr(_categories, category), name)
+    globals()[name] = message_class
+    return message_class
+
+def __dir__():
+    return sorted(set(globals()) | set(_message_categories))
+"""
+
+def hardcode_message_extractor(message : dict, templates_namespace : str, message_attributes : list) -> str:
     description = message.get('description', '')
     name = message['abbrev']
     
@@ -169,8 +261,7 @@ class {name}({namespace}base_message):
         \'\'\'Class constructor
         
         {description}\'\'\'
-{constructor_values}
-'''.format(namespace = namespace,
+{constructor_values}{pack_fields}'''.format(namespace = namespace,
 name = name,
 description = description,
 local_enum = local_enumeration,
@@ -178,10 +269,62 @@ priv_attrib = priv_attrib,
 attributes = attributes,
 mutable_attrib = mutable_attrib, 
 constructor_values = initialization_values,
-constructor_args = constructor_args)
+constructor_args = constructor_args,
+pack_fields = pack_extractor(message))
     
     return class_def
 
+def pack_extractor(message : dict) -> str:
+    '''Builds a specialized _pack_fields for the message class (see _base.base_message._pack_fields): runs of 
+    consecutive fixed size fields are packed at once by precompiled Structs (one per byte order, selected by the
+    given serial_functions), and the other fields by the serial functions.'''
+    ws = '    '
+    fields = message.get('fields', dict())
+
+    formats = []
+    expressions = []
+    run = []
+    for field, field_def in [*fields.items(), (None, None)]:
+        code = struct_codes.get(field_def['type'], None) if field_def is not None else None
+        if code is not None:
+            run.append((field, code))
+            continue
+        if run:
+            expressions.append('structs[{}].pack({})'.format(len(formats), ', '.join('self._' + f for f, _ in run)))
+            formats.append(''.join(c for _, c in run))
+            run = []
+        if field is None:
+            break
+        if field_def['type'] == 'message':
+            # a "NULL" message is serialized as its id
+            expressions.append('(serial_functions[\'uint16_t\'](65535) if self._{0} is None else serial_functions[\'message\'](self._{0}))'.format(field))
+        else:
+            expressions.append('serial_functions[\'{}\'](self._{})'.format(field_def['type'], field))
+
+    body = []
+    checked = ['self._' + f for f, field_def in fields.items() if field_def['type'] != 'message']
+    if checked:
+        body.append('if None in ({},):'.format(', '.join(checked)))
+        body.append(ws + 'raise ValueError(\'Cannot serialize a message that contains an empty (NoneType) field that is not a message.\')')
+    if formats:
+        body.append('structs = self._field_structs[serial_functions is _base.core.pack_functions_big]')
+    if not expressions:
+        body.append('return b\'\'')
+    elif len(expressions) == 1:
+        body.append('return ' + expressions[0])
+    else:
+        body.append('return b\'\'.join(({},))'.format(', '.join(expressions)))
+
+    structs = ''
+    if formats:
+        structs = {e : ', '.join('_struct.Struct(\'{}{}\')'.format('>' if e else '<', f) for f in formats) for e in (True, False)}
+        structs = '\n{}_field_structs = {{True : ({},), False : ({},)}}\n'.format(ws, structs[True], structs[False])
+    return '''{structs}
+{ws}def _pack_fields(self, *, serial_functions : dict) -> bytes:
+{ws}{ws}\'\'\'Serializes the fields (generated, see _base.base_message._pack_fields).\'\'\'
+{body}
+'''.format(ws = ws, structs = structs, body = '\n'.join(2*ws + line for line in body))
+
 def enum_extractor(enum : dict, name : str, isbitfield : bool) -> str:
     '''Builds an IntEnum or IntFlag from enumerations or bitfields of the XML definition.
     Bitfields are stored as integers of powers of 2 (as expected from the definition).
@@ -219,14 +362,103 @@ class {name}({parent_class}):
 
     return enum_def
 
-def create_init(path):
-    generated_files = os.listdir(path)
-
-    file_name = '/__init__.py'
-    with open(path + file_name, mode = 'w', encoding='utf-8') as f:
-        for name in generated_files:
-            if name.find('.py') > 0:
-                f.write('from . import {}\n'.format(name[:name.find('.py')]))
+def numpy_type(imc_type : str) -> Optional[str]:
+    '''Translates a numeric IMC type (e.g. uint16_t, fp32_t) into a numpy type without byte order (e.g. u2, f4).
+    Returns None for the other types (rawdata, plaintext, message, message-list).'''
+    match = re.fullmatch(r'(u?int|fp)(8|16|32|64)_t', imc_type)
+    if match is None:
+        return None
+    kind = {'uint' : 'u', 'int' : 'i', 'fp' : 'f'}[match.group(1)]
+    return kind + str(int(match.group(2)) // 8)
+
+def dtype_extractor(message : dict) -> Optional[list]:
+    '''Returns the fields of a message as a list of (name, numpy type) or None if its layout is not fixed.'''
+    fields = [(name, numpy_type(field['type'])) for name, field in message.get('fields', {}).items()]
+    if any(t is None for _, t in fields):
+        return None
+    return fields
+
+def create_init(files : dict) -> str:
+    '''Returns the __init__.py of the package, which imports the generated modules.'''
+    names = sorted(name[:-len('.py')] for name in files if '/' not in name and name.endswith('.py') and name != '__init__.py')
+    return ''.join('from . import {}\n'.format(name) for name in names) + 'from . import categories'
+
+@contextlib.contextmanager
+def generated_file(files : dict, name : str):
+    '''Collects the contents of a generated file (a path relative to the target folder), to be written by write_files.'''
+    buffer = io.StringIO()
+    yield buffer
+    files[name] = buffer.getvalue()
+
+def file_digest(contents : str) -> str:
+    return hashlib.sha256(contents.encode('utf-8')).hexdigest()
+
+def write_files(target : str, files : dict, previous : dict) -> int:
+    '''Writes the generated files to the target folder, except those whose contents did not change (so that their
+    compiled versions remain valid), and removes the files of the previous extraction (see read_cache) that are no 
+    longer generated (for example, of a category that has been blacklisted). Other files are left untouched.
+    Returns the number of written files.'''
+    written = 0
+    for name, contents in files.items():
+        path = os.path.join(target, name)
+        if os.path.isfile(path):
+            with open(path, mode = 'r', encoding='utf-8') as f:
+                if f.read() == contents:
+                    continue
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, mode = 'w', encoding='utf-8') as f:
+            f.write(contents)
+        written += 1
+
+    for name in previous:
+        if name not in files and os.path.isfile(os.path.join(target, name)):
+            os.remove(os.path.join(target, name))
+    return written
+
+def write_bundle(target : str, bundle : str) -> None:
+    '''Writes the generated package in the target folder to a single zip archive (see pyimclsts.network.load_package),
+    with the sources and their bytecode, compiled by this interpreter, so that processes that load it do not compile
+    (or even stat) the sources. The bytecode is not checked against the sources (unchecked hash-based .pyc, as the
+    archive is rewritten as a whole); other Python versions ignore it and compile the sources instead.'''
+    temporary = bundle + '.tmp'
+    # Stored, not compressed: loading is what should be fast
+    with zipfile.ZipFile(temporary, mode = 'w', compression=zipfile.ZIP_STORED) as z:
+        for folder in ['', 'categories/']:
+            for name in sorted(os.listdir(os.path.join(target, folder))):
+                if not name.endswith('.py'):
+                    continue
+                with open(os.path.join(target, folder, name), mode = 'rb') as f:
+                    source = f.read()
+                code = compile(source, os.path.join(os.path.basename(bundle), folder + name), 'exec', dont_inherit=True)
+                # PEP 552 header: magic number, flags (hash-based, unchecked) and hash of the source
+                pyc = importlib.util.MAGIC_NUMBER + (1).to_bytes(4, 'little') + importlib.util.source_hash(source) + marshal.dumps(code)
+                z.writestr(folder + name, source)
+                z.writestr(folder + name + 'c', pyc)
+    # (replaced at once, as other processes may be loading it)
+    os.replace(temporary, bundle)
+
+def read_cache(target : str) -> dict:
+    '''Reads the cache of a previous extraction: the digest of the XML and its parsed schema, and the key of the 
+    generation (digest of the XML, options and generator code) and digests of the files it wrote.'''
+    try:
+        with open(os.path.join(target, _cache_file), mode = 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+        return cache if cache.get('version', None) == _cache_version else dict()
+    except (OSError, ValueError):
+        return dict()
+
+def is_up_to_date(target : str, cache : dict, generation_key : str) -> bool:
+    '''Whether the files in the target folder were generated with the same key and were not modified since.'''
+    if cache.get('generation', None) != generation_key:
+        return False
+    for name, digest in cache.get('files', dict()).items():
+        try:
+            with open(os.path.join(target, name), mode = 'r', encoding='utf-8') as f:
+                if file_digest(f.read()) != digest:
+                    return False
+        except OSError:
+            return False
+    return True
 
 if __name__ == '__main__':
 
@@ -235,8 +467,16 @@ if __name__ == '__main__':
     group.add_argument("-w", "--whitelist", help='Messages that will be generated')
     group.add_argument("-b", "--blacklist", help='Messages that will not be generated')
     group.add_argument("-m", "--minimal", action="store_true", help='Generate minimal set only')
+    argparser.add_argument("-x", "--xml", default='IMC.xml', help='IMC definition (default: IMC.xml, which is downloaded if it does not exist)')
+    argparser.add_argument("-o", "--output", default=_target_folder, help=f'Folder of the generated package (default: {_target_folder}). '
+                            'Packages of other IMC versions can be loaded side by side (see pyimclsts.network.load_package)')
+    argparser.add_argument("-z", "--bundle", nargs='?', const='', default=None, help='Also write the package, precompiled, to a '
+                            'single zip archive (default: the output folder followed by .zip), which can be loaded instead of the folder, '
+                            'e.g., by short-lived worker processes. It is only precompiled for the running Python version')
 
     args = argparser.parse_args()
+    target_folder = args.output
+    bundle = (args.bundle or target_folder.rstrip('/\\') + '.zip') if args.bundle is not None else None
 
     if args.whitelist is not None or args.blacklist is not None:
         file = args.whitelist if args.whitelist is not None else args.blacklist
@@ -247,25 +487,27 @@ if __name__ == '__main__':
     else:
         message_list = set() # should never happen
     
-    file = 'IMC.xml'
+    file = args.xml
     # Check if IMC.xml does not exists in the current directory
     if not os.path.isfile(file):
         print(f'File {file} not found in current directory. Attempting to use a GZipped one...')
-        fileGzip = 'IMC.xml.gz'
+        fileGzip = file + '.gz'
         if not os.path.isfile(fileGzip):
+            if file != 'IMC.xml':
+                # only the default definition can be downloaded
+                exit(f'Neither {file} nor {fileGzip} were found.')
             print(f'File {fileGzip} not found in current directory. Attempting to download it from the default repository...')
         else:
             print(f'Found {fileGzip} in current directory. Using it...')
             # Gunzip the file
             with gzip.open(fileGzip, 'rb') as f_in:
-                with open('IMC.xml', 'wb') as f_out:
+                with open(file, 'wb') as f_out:
                     f_out.write(f_in.read())
-                    print(f'Unzipped {fileGzip} to IMC.xml')
+                    print(f'Unzipped {fileGzip} to {file}')
 
-    try:
-        tree = ET.parse(file)
+    if os.path.isfile(file):
         print(f'Reading {file} from current directory...')
-    except FileNotFoundError:
+    else:
         # Use HTTPS to get IMC.xml file from default repository
         default_repo = 'https://raw.githubusercontent.com/LSTS/imc/master/IMC.xml'
         print(f'Downloading {file} from default repository at {default_repo}.')
@@ -274,20 +516,44 @@ if __name__ == '__main__':
         print(f'Writing {file}...')
         with open(file, 'wb') as f:
             f.write(IMCxml)
-        tree = ET.parse(file)
-    
-    print('Extracting messages...')
+    with open(file, 'rb') as f:
+        IMCxml = f.read()
+
+    # The generated files depend on the XML, the options and the generator itself (this file and the templates)
+    lib_location = pathlib.Path(__file__).parent.resolve()
+    xml_digest = hashlib.sha256(IMCxml).hexdigest()
+    generation = hashlib.sha256(xml_digest.encode())
+    generation.update(repr((args.whitelist is not None, args.blacklist is not None, args.minimal, sorted(message_list))).encode())
+    for name in ['extract.py', 'extractutils.py', 'schema.py', '_base.py']:
+        generation.update((lib_location / name).read_bytes())
+    generation_key = generation.hexdigest()
+
+    cache = read_cache(target_folder)
+    if is_up_to_date(target_folder, cache, generation_key):
+        print(f'Folder \'{target_folder}\' is up to date.')
+        if bundle is not None:
+            write_bundle(target_folder, bundle)
+            print(f'Wrote bundle \'{bundle}\'.')
+        exit()
 
-    root = tree.getroot()
+    print('Extracting messages...')
+    if cache.get('xml', None) == xml_digest:
+        # Same XML: skip the parsing
+        metadata_encyclopedia = cache['schema']['metadata']
+        message_encyclopedia = {int(k) : v for k, v in cache['schema']['messages'].items()}
+    else:
+        root = ET.fromstring(IMCxml)
 
-    # Split the XML into metadata and messages
-    raw_metadata = [x for x in root if x.tag != 'message']
-    raw_messages = [x for x in root if x.tag == 'message']
+        # Split the XML into metadata and messages
+        raw_metadata = [x for x in root if x.tag != 'message']
+        raw_messages = [x for x in root if x.tag == 'message']
 
-    metadata_encyclopedia = {x.tag : extractutils.recursive_parser(x) for x in raw_metadata}
-    metadata_encyclopedia = extractutils.tree_shortener(metadata_encyclopedia,'')
+        metadata_encyclopedia = {x.tag : extractutils.recursive_parser(x) for x in raw_metadata}
+        metadata_encyclopedia = extractutils.tree_shortener(metadata_encyclopedia,'')
 
-    message_encyclopedia = {int(x.attrib['id']) : extractutils.recursive_parser(x) for x in raw_messages}
+        message_encyclopedia = {int(x.attrib['id']) : extractutils.recursive_parser(x) for x in raw_messages}
+    # (copied before it is filtered and reshaped below)
+    schema = {'metadata' : copy.deepcopy(metadata_encyclopedia), 'messages' : {str(k) : v for k, v in copy.deepcopy(message_encyclopedia).items()}}
 
     if args.blacklist is not None:
         message_encyclopedia = {k: v for k,v in message_encyclopedia.items() if v['abbrev'] not in [i for i in message_list if i not in minimal]}
@@ -332,6 +598,8 @@ if __name__ == '__main__':
     for message in message_encyclopedia:
         for attrib in message_encyclopedia[message]:
             message_attributes.add(attrib.replace('-',''))
+    # sorted, so that the generated files do not depend on the hash seed (see write_files)
+    message_attributes = sorted(message_attributes)
 
     fields_attributes = set()
     for message in message_encyclopedia:
@@ -339,37 +607,24 @@ if __name__ == '__main__':
             for child_attrib in message_encyclopedia[message]['fields'][attrib]:
                 fields_attributes.add(child_attrib)
 
-    # future flag
-    force = True
-
-    if os.path.isdir(_target_folder):
-        if os.listdir(_target_folder):
-            if force:
-                shutil.rmtree(_target_folder)
-                os.mkdir(_target_folder)
-            else:
-                exit('Folder \'{}\' is not empty!'.format(_target_folder))
-    else:
-        os.mkdir(_target_folder)
-    
-    os.mkdir(_target_folder + '/categories')
+    os.makedirs(target_folder + '/categories', exist_ok=True)
 
-    # Write files
+    # Generate files (in memory, see write_files)
+    files = dict()
     file_name = 'enumerations.py'
-    with open(_target_folder + '/' + file_name, mode = 'w', encoding='utf-8') as f:
+    with generated_file(files, file_name) as f:
         f.write('\'\'\'\nIMC global enumerations definitions.\n\'\'\'\n\n')
         f.write('import enum as _enum\n\n#Enumerations:\n')
         for k, v in metadata_encyclopedia['enumerations'].items():
             f.write(enum_extractor(v, k, False))
     
     file_name = 'bitfields.py'
-    with open(_target_folder + '/' + file_name, mode = 'w', encoding='utf-8') as f:
+    with generated_file(files, file_name) as f:
         f.write('\'\'\'\nIMC global bitfields definitions.\n\'\'\'\n\n')
         f.write('import enum as _enum\n\n#Enumerations:\n')
         for k, v in metadata_encyclopedia['bitfields'].items():
             f.write(enum_extractor(v, k, True))
     
-    lib_location = pathlib.Path(__file__).parent.resolve()
     file_name = '_base.py'
     with open(str(lib_location) + '/' + file_name, mode = 'r', encoding='utf-8') as f_in:
         base_templates = f_in.read()
@@ -382,42 +637,64 @@ if __name__ == '__main__':
         base_templates = base_templates.replace('%IMC_TYPES%', str(imc_types).replace('<class \'', '').replace("'>",'').replace('"',''))
         base_templates = base_templates.replace('%MESSAGE_ATTRIBUTES%', str([s.replace('-','') for s in message_attributes]))
 
-        with open(_target_folder + '/' + file_name, mode = 'w', encoding='utf-8') as f_out:           
+        with generated_file(files, file_name) as f_out:
             f_out.write(base_templates)
 
     file_name = 'messages.py'
-    with open(_target_folder + '/' + file_name, mode = 'w', encoding='utf-8') as f:
+    with generated_file(files, file_name) as f:
         f.write('\'\'\'\nIMC messages.\n\'\'\'\n\n')
         # write import statements
-        f.write('from . import _base\nimport enum as _enum\nimport pyimclsts.core as _core\nfrom . import categories as _categories\nfrom typing import Optional, Any\n')
+        f.write('from . import _base\nimport enum as _enum\nimport struct as _struct\nimport pyimclsts.core as _core\nfrom . import categories as _categories\nfrom typing import Optional, Any\n')
         f.write('\n_message_ids = {}\n'.format(str(dict((k, v['abbrev']) for k, v in message_encyclopedia.items()))))
         f.write('\n# Re-export:\nIMC_message = _core.IMC_message\n')
         f.write(unknown_message.replace('##ATTRIBUTES##', ', '.join([i + '= None' for i in message_attributes if i not in {'fields', 'name', 'id', 'abbrev', 'description'}])))
 
         messages_w_cat = []
+        categories = []
         for cat, l in metadata_encyclopedia['categories'].items():
             l_filtered = [x for x in l if x in message_encyclopedia.keys()]
             if l_filtered:
-                with open(_target_folder + '/categories/' + cat.replace(' ', '') + '.py', mode = 'w', encoding='utf-8') as f_cat:
+                with generated_file(files, 'categories/' + cat.replace(' ', '') + '.py') as f_cat:
                     f_cat.write(f'\'\'\'\nIMC {cat} messages.\n\'\'\'\n\n')
                     # write import statements
-                    f_cat.write('from .. import _base\nimport enum as _enum\n')
+                    f_cat.write('from .. import _base\nimport enum as _enum\nimport struct as _struct\n')
                     
                     for id in l_filtered:
                         f_cat.write(hardcode_message_extractor(message_encyclopedia[id], '_base', message_attributes))    
                 messages_w_cat = messages_w_cat + l_filtered
+                categories.append(cat.replace(' ', ''))
         
+        # Messages with a category are imported lazily (see lazy_messages), the others are defined here
         for k, v in message_encyclopedia.items():
-            if k in messages_w_cat:
-                f.write('\n\n' + v['abbrev'] + ' = _categories.' + v['category'].replace(' ', '') + '.' + v['abbrev'])
-            else:
+            if k not in messages_w_cat:
                 f.write(hardcode_message_extractor(v, '_base', message_attributes))
+        message_categories = {message_encyclopedia[k]['abbrev'] : message_encyclopedia[k]['category'].replace(' ', '') for k in messages_w_cat}
+        f.write(lazy_messages.replace('##MESSAGE_CATEGORIES##', str(message_categories)))
     
-    create_init(_target_folder + '/categories')
-    create_init(_target_folder)
-
-    # small ugly fix
-    with open(_target_folder + '/__init__.py', mode = 'a', encoding='utf-8') as f:
-        f.write('from . import categories')
-
-    print('Finished extracting messages.')
+    file_name = 'dtypes.py'
+    with generated_file(files, file_name) as f:
+        if 'header' not in metadata_encyclopedia or 'fields' not in metadata_encyclopedia['header']:
+            header_fields = metadata_encyclopedia['header']
+        else:
+            header_fields = metadata_encyclopedia['header']['fields']
+        header = [('header.' + name, numpy_type(field['type'])) for name, field in header_fields.items() if isinstance(field, dict)]
+        # the footer has a single field (the CRC)
+        footer = [('footer.crc', 'u2')]
+        fixed = {k : dtype_extractor(v) for k, v in message_encyclopedia.items()}
+        f.write(dtypes_module.replace('##HEADER##', str(header)).replace('##FOOTER##', str(footer))
+                    .replace('##FIELDS##', str({k : v for k, v in fixed.items() if v is not None})))
+
+    with generated_file(files, 'categories/__init__.py') as f:
+        f.write(categories_init.replace('##CATEGORIES##', str(categories)))
+    with generated_file(files, '__init__.py') as f:
+        f.write(create_init(files))
+
+    written = write_files(target_folder, files, cache.get('files', dict()))
+    with open(os.path.join(target_folder, _cache_file), mode = 'w', encoding='utf-8') as f:
+        json.dump({'version' : _cache_version, 'xml' : xml_digest, 'schema' : schema, 'generation' : generation_key,
+                    'files' : {name : file_digest(contents) for name, contents in files.items()}}, f)
+
+    print(f'Finished extracting messages ({written} of {len(files)} files changed).')
+    if bundle is not None:
+        write_bundle(target_folder, bundle)
+        print(f'Wrote bundle \'{bundle}\'.')
@@ -0,0 +1,1233 @@
+'''
+    Contains classes and functions to read and write LSF logs, that is, files of concatenated
+    IMC messages, such as the Data.lsf files written by DUNE.
+
+    Unlike the subscriber (see network.py), which is meant to handle live streams, the
+    readers here are synchronous: there is no event loop, no child process and no periodic
+    queries. Messages are simply read, validated and (optionally) deserialized in a tight loop.
+'''
+from typing import Iterator, Iterable, Optional, Union, Tuple, List, Dict, Callable, Any
+import inspect as _inspect
+import functools as _functools
+import collections as _collections
+import concurrent.futures as _futures
+import mmap as _mmap
+import os as _os
+import sys as _sys
+import struct as _struct
+import array as _array
+import hashlib as _hashlib
+import bisect as _bisect
+import zlib as _zlib
+import shutil as _shutil
+import heapq as _heapq
+import gzip as _gzip
+import time as _time
+import argparse
+
+import pyimclsts.core as _core
+import pyimclsts.schema as _schema
+import pyimclsts.network as _network
+
+_pg = _network._pg
+
+# Sync number as it appears in the byte stream. Both endiannesses are valid. (It is the one of the IMC specification, 
+# and not read from the generated package, which is only loaded on first use. See network._lazy_package.)
+_sync_number = 0xFE54
+_sync_big = _sync_number.to_bytes(2, byteorder='big')
+_sync_little = _sync_number.to_bytes(2, byteorder='little')
+
+# magic number: 22 = 20(header size) + 2(CRC) sizes in bytes.
+_header_size = 20
+_frame_overhead = 22
+
+_header_big = _struct.Struct('>HHHdHBHB')
+_header_little = _struct.Struct('<HHHdHBHB')
+_timestamp_big = _struct.Struct('>d')
+_timestamp_little = _struct.Struct('<d')
+
+# Bytes read at a time when looking for a frame at a random position (see log_reader.seek_time)
+_seek_block = 1 << 16
+# Frames that must follow a frame found at a random position, back-to-back, for it to be trusted (see _chained)
+_probe_chain = 3
+
+# Header columns returned by columns_parallel and extract_columns
+_header_columns = ['header.timestamp', 'header.src', 'header.src_ent']
+
+def _find_frame(buffer : Any, pos : int, end : int, validate_crc : bool = True, at_eof : bool = False) -> Tuple[int, int]:
+    '''Looks for the first valid frame in buffer[pos:end]. buffer can be any object that supports
+    indexing, slicing and .find(), such as bytes, bytearray or mmap.
+
+    Returns (offset, length) of the frame. If there is no complete frame, length is 0 and offset is the
+    position from which the search must be resumed once more bytes are available. If at_eof is True, end is
+    the end of the log: a sync number whose size goes beyond it is garbage, not a partial frame, and is skipped.
+    '''
+    while pos + _frame_overhead <= end:
+        b0 = buffer[pos]
+        b1 = buffer[pos + 1]
+        if b0 == _sync_little[0] and b1 == _sync_little[1]:
+            size = buffer[pos + 4] | (buffer[pos + 5] << 8)
+            byteorder = 'little'
+        elif b0 == _sync_big[0] and b1 == _sync_big[1]:
+            size = (buffer[pos + 4] << 8) | buffer[pos + 5]
+            byteorder = 'big'
+        else:
+            # Not a sync number: jump to the next candidate
+            pos = _find_sync(buffer, pos + 1, end)
+            continue
+
+        length = size + _frame_overhead
+        if pos + length > end:
+            if not at_eof:
+                return (pos, 0)
+            pos = _find_sync(buffer, pos + 1, end)
+            continue
+
+        if validate_crc and _core.CRC16IMB(buffer[pos:pos + length - 2]) != int.from_bytes(buffer[pos + length - 2:pos + length], byteorder=byteorder):
+            # sync number is not followed by a sound/valid message. Look for the next one.
+            pos = _find_sync(buffer, pos + 1, end)
+            continue
+
+        return (pos, length)
+
+    return (pos, 0)
+
+def _chained(buffer : Any, pos : int, end : int, validate_crc : bool, at_eof : bool) -> Optional[bool]:
+    '''Whether buffer[pos:end] starts with _probe_chain valid frames, back-to-back, or with fewer and then the end of
+    the log. Used to tell the frames of a log from frames carried in the payload of another one (e.g., relayed by a 
+    gateway), which are not followed by other frames. Returns None if more bytes are needed to decide.'''
+    for _ in range(_probe_chain):
+        (next_pos, length) = _find_frame(buffer, pos, end, validate_crc, at_eof)
+        if next_pos != pos:
+            return False
+        if length == 0:
+            # (at the end of the log, there is not enough left for a frame)
+            return True if at_eof else None
+        pos += length
+    return True
+
+def _find_sync(buffer : Any, pos : int, end : int) -> int:
+    '''Returns the position of the next (possible) sync number in buffer[pos:end].
+    If there is none, returns the position of the last byte, which may be the first half of a sync number.'''
+    little = buffer.find(_sync_little, pos, end)
+    big = buffer.find(_sync_big, pos, end)
+    if little < 0 and big < 0:
+        return max(end - 1, pos)
+    if little < 0 or big < 0:
+        return max(little, big)
+    return min(little, big)
+
+def _header_ids(buffer : Any, pos : int) -> Tuple[int, int, int]:
+    '''Same as network._get_id_src_src_ent, but peeks the frame at buffer[pos:].'''
+    byteorder = 'big' if buffer[pos] == _sync_big[0] and buffer[pos + 1] == _sync_big[1] else 'little'
+    mgid = int.from_bytes(buffer[pos + 2:pos + 4], byteorder=byteorder)
+    src = int.from_bytes(buffer[pos + 14:pos + 16], byteorder=byteorder)
+    return (mgid, src, buffer[pos + 16])
+
+def _frame_timestamp(buffer : Any, pos : int) -> float:
+    '''Peeks the header timestamp of the frame at buffer[pos:].'''
+    timestamp = _timestamp_big if buffer[pos] == _sync_big[0] and buffer[pos + 1] == _sync_big[1] else _timestamp_little
+    return timestamp.unpack(buffer[pos + 6:pos + 14])[0]
+
+def _get_msg_ids(msg_ids : Any) -> Optional[set]:
+    '''Translates messages given as ints, classes, instances, abbrevs (e.g. 'EstimatedState') or an
+    iterable of those to a set of message ids. None is interpreted as 'all'.'''
+    if msg_ids is None:
+        return None
+    if isinstance(msg_ids, (int, str, _core.IMC_message)) or _inspect.isclass(msg_ids):
+        msg_ids = [msg_ids]
+
+    abbrev2id = {v : k for k, v in _pg.messages._message_ids.items()}
+    ids = set()
+    for m in msg_ids:
+        if isinstance(m, int):
+            ids.add(m)
+        elif isinstance(m, str):
+            if m not in abbrev2id:
+                raise KeyError(f'Unknown message \'{m}\'')
+            ids.add(abbrev2id[m])
+        elif isinstance(m, _core.IMC_message) or (_inspect.isclass(m) and issubclass(m, _core.IMC_message)):
+            ids.add(m.Attributes.id)
+        else:
+            raise TypeError(f'Cannot interpret {m} as a message.')
+    return ids
+
+def _get_srcs(src : Optional[Union[int, Iterable[int]]]) -> Optional[set]:
+    '''Also used for src_ent.'''
+    if src is None:
+        return None
+    if isinstance(src, int):
+        return {src}
+    return set(src)
+
+# Frame index file:
+_index_magic = b'LSFIDX01'
+# magic, log size, log mtime (ns), number of frames, digest of the log (see _log_digest)
+_index_header = _struct.Struct('<8sQqQ32s')
+# (column, array typecode). Columns are stored contiguously, as little-endian, in this order.
+_index_columns = (('offset', 'Q'), ('length', 'I'), ('mgid', 'H'), ('timestamp', 'd'), ('src', 'H'), ('src_ent', 'B'), ('dst', 'H'))
+_digest_sample = 1 << 20
+
+_gzip_magic = b'\x1f\x8b'
+# zlib window bits of a gzip stream
+_gzip_wbits = _zlib.MAX_WBITS | 16
+
+class _gzip_file:
+    '''A read-only and seekable view of the decompressed contents of a gzip file, given as a (binary) file object.
+
+    The stream is decompressed in blocks of block_size (compressed) bytes. Every checkpoint_interval decompressed bytes,
+    a copy of the decompressor state is kept in memory, so that seeking (backwards or far ahead of what has been 
+    decompressed so far) resumes from the closest checkpoint instead of the beginning of the file. Concatenated 
+    gzip members and truncated files (e.g., logs of a vehicle that was powered off) are also handled.
+    '''
+    __slots__ = ['_file', '_block_size', '_interval', '_decompressor', '_in_offset', '_out', '_out_offset', '_pos',
+                    '_checkpoints', '_checkpoint_offsets', '_size']
+
+    def __init__(self, file : Any, *, block_size : int = 1 << 18, checkpoint_interval : int = 1 << 22) -> None:
+        self._file = file
+        self._block_size = block_size
+        self._interval = checkpoint_interval
+        self._size = None
+        # (decompressed offset, compressed offset, decompressor) and the decompressed offsets, for bisect
+        self._checkpoints = [(0, 0, _zlib.decompressobj(_gzip_wbits))]
+        self._checkpoint_offsets = [0]
+        self._restart(*self._checkpoints[0])
+
+    def _restart(self, out_offset : int, in_offset : int, decompressor : Any) -> None:
+        self._file.seek(in_offset)
+        self._in_offset = in_offset
+        # copy, so that the checkpoint can be used again
+        self._decompressor = decompressor.copy()
+        self._out = b''
+        # decompressed offset of self._out[0] and position in self._out
+        self._out_offset = out_offset
+        self._pos = 0
+
+    def _inflate(self) -> bool:
+        '''Replaces self._out by the next decompressed block. Returns False (and keeps self._out) at the end of the file.'''
+        while True:
+            d = self._decompressor
+            if d.eof:
+                # Start of another member, if any
+                pending = d.unused_data
+                if not pending:
+                    pending = self._file.read(self._block_size)
+                    self._in_offset += len(pending)
+                    if not pending:
+                        return False
+                d = self._decompressor = _zlib.decompressobj(_gzip_wbits)
+                try:
+                    out = d.decompress(pending)
+                except _zlib.error:
+                    # trailing garbage (e.g., zero padding) after the last member
+                    return False
+            else:
+                pending = self._file.read(self._block_size)
+                self._in_offset += len(pending)
+                if not pending:
+                    # truncated file
+                    return False
+                out = d.decompress(pending)
+
+            if not out:
+                continue
+            self._out_offset += len(self._out)
+            self._out = out
+            self._pos = 0
+
+            end = self._out_offset + len(out)
+            # The state can only be restored if all the input that was read has been consumed by this decompressor
+            if not d.eof and end >= self._checkpoint_offsets[-1] + self._interval:
+                self._checkpoints.append((end, self._in_offset, d.copy()))
+                self._checkpoint_offsets.append(end)
+            return True
+
+    def read(self, n : int = -1) -> bytes:
+        chunks = []
+        while n != 0:
+            if self._pos == len(self._out) and not self._inflate():
+                break
+            chunk = self._out[self._pos:] if n < 0 else self._out[self._pos:self._pos + n]
+            self._pos += len(chunk)
+            if n > 0:
+                n -= len(chunk)
+            chunks.append(chunk)
+        return b''.join(chunks)
+
+    def tell(self) -> int:
+        return self._out_offset + self._pos
+
+    def seek(self, offset : int) -> int:
+        '''Moves to the given decompressed offset (or to the end of the file, if it is beyond it).'''
+        if self._out_offset <= offset <= self._out_offset + len(self._out):
+            self._pos = offset - self._out_offset
+            return offset
+
+        checkpoint = self._checkpoints[_bisect.bisect_right(self._checkpoint_offsets, offset) - 1]
+        if offset < self._out_offset or checkpoint[0] > self._out_offset + len(self._out):
+            self._restart(*checkpoint)
+        while self._out_offset + len(self._out) < offset:
+            if not self._inflate():
+                break
+        self._pos = min(offset - self._out_offset, len(self._out))
+        return self.tell()
+
+    def size(self) -> int:
+        '''Decompressed size. The first call decompresses the rest of the file (leaving checkpoints behind).'''
+        if self._size is None:
+            pos = self.tell()
+            while self._inflate():
+                pass
+            self._size = self._out_offset + len(self._out)
+            self.seek(pos)
+        return self._size
+
+    def close(self) -> None:
+        self._file.close()
+
+def _is_gzip(path : str) -> bool:
+    with open(path, 'rb') as f:
+        return f.read(2) == _gzip_magic
+
+def _log_digest(path : str, size : int) -> bytes:
+    '''Hash of the size and of the first and last MiB of the log. It is used to check whether an index
+    is stale, when the modification time of the log changed (e.g., it was copied).'''
+    h = _hashlib.blake2b(size.to_bytes(8, byteorder='little'), digest_size=32)
+    with open(path, 'rb') as f:
+        h.update(f.read(_digest_sample))
+        if size > _digest_sample:
+            f.seek(max(size - _digest_sample, _digest_sample))
+            h.update(f.read())
+    return h.digest()
+
+class frame_index:
+    '''
+        Index of the frames of a LSF log: one record per (valid) frame, with its offset, length, message id,
+        timestamp, src, src_ent and dst. The records are stored as columns (array.array, that can be wrapped
+        by numpy.frombuffer without copies), which are also attributes of the index.
+
+        Use load_index (or build_index) to get one and give it to log_reader to read frames directly.
+    '''
+    __slots__ = ['offset', 'length', 'mgid', 'timestamp', 'src', 'src_ent', 'dst', '_log_size', '_log_mtime', '_log_digest']
+
+    def __init__(self) -> None:
+        for name, typecode in _index_columns:
+            setattr(self, name, _array.array(typecode))
+        self._log_size = 0
+        self._log_mtime = 0
+        self._log_digest = bytes(32)
+
+    def __len__(self) -> int:
+        return len(self.offset)
+
+    def select(self, *, msg_ids : Any = None, src : Optional[Union[int, Iterable[int]]] = None, 
+                src_ent : Optional[Union[int, Iterable[int]]] = None) -> List[int]:
+        '''Returns the positions (in the index) of the frames that pass the filters. See log_reader for the arguments.'''
+        msg_ids = _get_msg_ids(msg_ids)
+        srcs = _get_srcs(src)
+        src_ents = _get_srcs(src_ent)
+        selected = range(len(self))
+        if msg_ids is not None:
+            mgid = self.mgid
+            selected = [i for i in selected if mgid[i] in msg_ids]
+        if srcs is not None:
+            src = self.src
+            selected = [i for i in selected if src[i] in srcs]
+        if src_ents is not None:
+            src_ent = self.src_ent
+            selected = [i for i in selected if src_ent[i] in src_ents]
+        return list(selected)
+
+    def is_valid_for(self, path : str) -> bool:
+        '''Checks whether the index (still) describes the given log: by size and modification time or, if
+        the latter changed, by content (see _log_digest).'''
+        st = _os.stat(path)
+        if st.st_size != self._log_size:
+            return False
+        if st.st_mtime_ns == self._log_mtime:
+            return True
+        return _log_digest(path, st.st_size) == self._log_digest
+
+    def save(self, index_path : str) -> None:
+        with open(index_path, 'wb') as f:
+            f.write(_index_header.pack(_index_magic, self._log_size, self._log_mtime, len(self), self._log_digest))
+            for name, _ in _index_columns:
+                column = getattr(self, name)
+                if _sys.byteorder == 'big':
+                    column = _array.array(column.typecode, column)
+                    column.byteswap()
+                f.write(column.tobytes())
+
+def _read_index(index_path : str) -> frame_index:
+    index = frame_index()
+    with open(index_path, 'rb') as f:
+        (magic, index._log_size, index._log_mtime, n, index._log_digest) = _index_header.unpack(f.read(_index_header.size))
+        if magic != _index_magic:
+            raise ValueError(f'{index_path} is not a (compatible) frame index.')
+        for name, typecode in _index_columns:
+            column = getattr(index, name)
+            column.frombytes(f.read(n * column.itemsize))
+            if len(column) != n:
+                raise ValueError(f'{index_path} is truncated.')
+            if _sys.byteorder == 'big':
+                column.byteswap()
+    return index
+
+def default_index_path(path : str) -> str:
+    '''The index is stored next to the log: Data.lsf -> Data.lsf.idx'''
+    return path + '.idx'
+
+def build_index(path : str, *, index_path : Optional[str] = None, save : bool = True) -> frame_index:
+    '''Scans the whole log (checking the CRC of every frame) and builds its frame index, which is saved 
+    to index_path (see default_index_path), unless save is False. The index does not depend on the IMC version:
+    it includes frames whose size does not match their message, which are skipped when the index is read.'''
+    index = frame_index()
+    st = _os.stat(path)
+    index._log_size = st.st_size
+    index._log_mtime = st.st_mtime_ns
+    index._log_digest = _log_digest(path, st.st_size)
+
+    columns = [getattr(index, name) for name, _ in _index_columns]
+    (offsets, lengths, mgids, timestamps, srcs, src_ents, dsts) = columns
+    with log_reader(path, use_mmap=True, validate_size=False) as reader:
+        for offset, length in reader._scan():
+            pos = reader._pos - length
+            buffer = reader._buffer
+            header = _header_big if buffer[pos] == _sync_big[0] and buffer[pos + 1] == _sync_big[1] else _header_little
+            (_, mgid, _, timestamp, src, src_ent, dst, _) = header.unpack(buffer[pos:pos + _header_size])
+            offsets.append(offset)
+            lengths.append(length)
+            mgids.append(mgid)
+            timestamps.append(timestamp)
+            srcs.append(src)
+            src_ents.append(src_ent)
+            dsts.append(dst)
+
+    if save:
+        index.save(index_path if index_path is not None else default_index_path(path))
+    return index
+
+def load_index(path : str, *, index_path : Optional[str] = None, build : bool = True) -> Optional[frame_index]:
+    '''Loads the frame index of the given log, if it exists and it is up to date. Otherwise, builds (and saves) it,
+    or returns None if build is False.'''
+    index_path = index_path if index_path is not None else default_index_path(path)
+    if _os.path.isfile(index_path):
+        try:
+            index = _read_index(index_path)
+            if index.is_valid_for(path):
+                return index
+        except (ValueError, _struct.error):
+            pass
+    return build_index(path, index_path=index_path) if build else None
+
+class log_reader:
+    '''
+        Synchronous reader of a LSF log.
+
+        Frames are read in large blocks, validated (sync number and CRC) and filtered by their header
+        (message id and source system), before any deserialization. Like a file object, the reader keeps
+        its position: frames() and messages() continue from where the previous iteration stopped.
+
+        msg_ids can be given as ints, message classes, abbrevs (e.g. 'EstimatedState') or an iterable of those.
+        src and src_ent are the source system and entity ids (as ints) or iterables of them. None means 'all'.
+        Disabling validate_crc speeds up the reading of trusted logs. With validate_size, frames whose payload size
+        does not match the layout of their message (see schema.size_validator), for example, written with another
+        IMC version, are skipped, before they fail to deserialize. frame_statistics() counts them.
+
+        If a frame index (see load_index) is given, the log is not scanned: the frames that pass the filters are
+        read directly from their offsets (and their CRC is not checked again).
+
+        seek_time and read_range assume that the log is (approximately) sorted by timestamp, which is the case
+        of the logs written by DUNE. Without an index, they binary search the file, resynchronizing (sync number
+        and CRC) at each probed offset. With an index, they binary search its timestamps.
+
+        With use_mmap, the whole log is memory-mapped instead of read in blocks: frames are yielded as
+        memoryviews of the mapping (no copies) and are deserialized directly from it. Since the pages are
+        backed by the file, the operating system can reclaim them, which keeps the memory usage roughly 
+        constant regardless of the size of the log. Note that frames (memoryviews) should not be kept
+        after the reader is closed.
+
+        Compressed logs (Data.lsf.gz) are detected and decompressed on the fly, in large blocks. Offsets (and thus 
+        frame indexes) refer to the decompressed log. Seeking resumes the decompression from in-memory checkpoints
+        (see _gzip_file), which are created as the log is read. use_mmap has no effect on compressed logs.
+    '''
+    __slots__ = ['_path', '_file', '_msg_ids', '_src', '_src_ent', '_validate_crc', '_size_validator', '_block_size', '_buffer', 
+                 '_buffer_offset', '_pos', '_mmap', '_view', '_index', '_index_pos']
+
+    def __init__(self, path : str, *, msg_ids : Any = None, src : Optional[Union[int, Iterable[int]]] = None,
+                    src_ent : Optional[Union[int, Iterable[int]]] = None, validate_crc : bool = True, block_size : int = 1 << 20, 
+                    use_mmap : bool = False, index : Optional[frame_index] = None, validate_size : bool = True) -> None:
+        self._path = path
+        self._msg_ids = _get_msg_ids(msg_ids)
+        self._src = _get_srcs(src)
+        self._src_ent = _get_srcs(src_ent)
+        self._validate_crc = validate_crc
+        self._size_validator = _schema.size_validator(_pg) if validate_size else None
+        self._block_size = block_size
+
+        self._file = open(path, 'rb')
+        if self._file.read(2) == _gzip_magic:
+            self._file = _gzip_file(self._file)
+        else:
+            self._file.seek(0)
+        self._buffer = bytearray()
+        # file offset of self._buffer[0] and current position in the buffer
+        self._buffer_offset = 0
+        self._pos = 0
+
+        self._index = index
+        # next position in the index
+        self._index_pos = 0
+
+        self._mmap = None
+        self._view = None
+        # (an empty file cannot be mapped and mapping a compressed one would be useless)
+        if use_mmap and not isinstance(self._file, _gzip_file) and self._size() > 0:
+            self._mmap = _mmap.mmap(self._file.fileno(), 0, access=_mmap.ACCESS_READ)
+            if hasattr(self._mmap, 'madvise') and hasattr(_mmap, 'MADV_SEQUENTIAL'):
+                self._mmap.madvise(_mmap.MADV_SEQUENTIAL)
+            self._buffer = self._mmap
+            self._view = memoryview(self._mmap)
+
+    def _scan(self) -> Iterator[Tuple[int, int]]:
+        '''Yields (file offset, length) of the valid frames that pass the filters.
+        The frame itself is at self._buffer[self._pos - length:self._pos] when it is yielded.'''
+        msg_ids = self._msg_ids
+        srcs = self._src
+        src_ents = self._src_ent
+        validator = self._size_validator
+        if self._index is not None:
+            yield from self._scan_index()
+            return
+
+        # The whole log is mapped: there is nothing more to read
+        at_eof = self._mmap is not None
+        while True:
+            (pos, length) = _find_frame(self._buffer, self._pos, len(self._buffer), self._validate_crc, at_eof)
+            self._pos = pos
+            if length == 0:
+                if at_eof:
+                    return
+                # Incomplete frame: discard what has been consumed and read another block
+                block = self._file.read(self._block_size)
+                if not block:
+                    # Search the rest of the buffer again, skipping what looked like the start of a frame
+                    at_eof = True
+                    continue
+                self._buffer_offset += self._pos
+                del self._buffer[:self._pos]
+                self._pos = 0
+                self._buffer += block
+                continue
+
+            self._pos = pos + length
+            if msg_ids is not None or srcs is not None or src_ents is not None or validator is not None:
+                mgid, src, src_ent = _header_ids(self._buffer, pos)
+                if (msg_ids is not None and mgid not in msg_ids) or (srcs is not None and src not in srcs) \
+                        or (src_ents is not None and src_ent not in src_ents):
+                    continue
+                if validator is not None and not validator(mgid, length - _frame_overhead, 
+                                                            _network.get_package(src) if _network._source_packages else None):
+                    continue
+            yield (self._buffer_offset + pos, length)
+
+    def _scan_index(self) -> Iterator[Tuple[int, int]]:
+        '''Same as _scan, but over the frame index.'''
+        index = self._index
+        msg_ids = self._msg_ids
+        srcs = self._src
+        src_ents = self._src_ent
+        validator = self._size_validator
+        while self._index_pos < len(index):
+            i = self._index_pos
+            self._index_pos += 1
+            if (msg_ids is not None and index.mgid[i] not in msg_ids) or (srcs is not None and index.src[i] not in srcs) \
+                    or (src_ents is not None and index.src_ent[i] not in src_ents):
+                continue
+            if validator is not None and not validator(index.mgid[i], index.length[i] - _frame_overhead,
+                                                        _network.get_package(index.src[i]) if _network._source_packages else None):
+                continue
+            yield (index.offset[i], index.length[i])
+
+    def _size(self) -> int:
+        '''Size of the log (decompressed, if it is compressed).'''
+        if isinstance(self._file, _gzip_file):
+            return self._file.size()
+        return _os.fstat(self._file.fileno()).st_size
+
+    def _set_offset(self, offset : int) -> None:
+        '''Moves the reader to the given file offset.'''
+        if self._mmap is not None:
+            self._pos = offset
+        else:
+            self._file.seek(offset)
+            self._buffer = bytearray()
+            self._buffer_offset = offset
+            self._pos = 0
+
+    def _frame_at(self, offset : int) -> Optional[Tuple[int, int, float]]:
+        '''Returns (offset, length, timestamp) of the first valid frame at or after the given offset, regardless 
+        of the filters, or None if there is none. Frames that are not followed by other frames (see _chained) are 
+        skipped.'''
+        if self._mmap is not None:
+            pos = offset
+            while True:
+                (pos, length) = _find_frame(self._mmap, pos, len(self._mmap), self._validate_crc, True)
+                if not length:
+                    return None
+                if _chained(self._mmap, pos + length, len(self._mmap), self._validate_crc, True):
+                    return (pos, length, _frame_timestamp(self._mmap, pos))
+                pos += 1
+
+        self._file.seek(offset)
+        buffer = bytearray()
+        pos = 0
+        at_eof = False
+        while True:
+            (pos, length) = _find_frame(buffer, pos, len(buffer), self._validate_crc, at_eof)
+            if length:
+                chained = _chained(buffer, pos + length, len(buffer), self._validate_crc, at_eof)
+                if chained:
+                    return (offset + pos, length, _frame_timestamp(buffer, pos))
+                if chained is False:
+                    pos += 1
+                    continue
+            elif at_eof:
+                return None
+            # More bytes are needed. Drop what has been searched already
+            block = self._file.read(_seek_block)
+            at_eof = not block
+            offset += pos
+            del buffer[:pos]
+            pos = 0
+            buffer += block
+
+    def seek_time(self, t : float) -> None:
+        '''Moves the reader to the first frame (that passes the filters) whose timestamp is greater than or equal to t
+        (seconds since epoch, as in the header). If there is none, the reader is moved to the end of the log.'''
+        if self._index is not None:
+            self._index_pos = _bisect.bisect_left(self._index.timestamp, t)
+            return
+
+        # Binary search: frames before lo have timestamps < t
+        lo = 0
+        hi = self._size()
+        while hi - lo > _seek_block:
+            mid = (lo + hi) // 2
+            frame = self._frame_at(mid)
+            if frame is None or frame[2] >= t:
+                hi = mid
+            else:
+                lo = frame[0]
+
+        # Linear search from there
+        self._set_offset(lo)
+        for offset, length in self._scan():
+            if _frame_timestamp(self._buffer, offset - self._buffer_offset) >= t:
+                self._set_offset(offset)
+                return
+
+    def read_range(self, t0 : float, t1 : float, *, raw : bool = False) -> Iterator[Union[_core.IMC_message, bytes, memoryview]]:
+        '''Yields the messages (or frames, if raw is True) whose timestamp is in [t0, t1[. It stops at the first 
+        message (that passes the filters) whose timestamp is t1 or later.'''
+        self.seek_time(t0)
+        unpack = _network.unpack
+        for frame in self.frames():
+            timestamp = _frame_timestamp(frame, 0)
+            if timestamp >= t1:
+                return
+            if timestamp >= t0:
+                yield frame if raw else unpack(frame, fast_mode=True)
+
+    def frames(self) -> Iterator[Union[bytes, memoryview]]:
+        '''Yields the (CRC checked) frames, that is, serialized messages (header + fields + CRC), as bytes
+        or, if the log is memory-mapped, as memoryviews.'''
+        if self._view is not None:
+            view = self._view
+            for offset, length in self._scan():
+                yield view[offset:offset + length]
+        elif self._index is not None:
+            for offset, length in self._scan():
+                self._file.seek(offset)
+                yield self._file.read(length)
+        else:
+            for _, length in self._scan():
+                yield bytes(self._buffer[self._pos - length:self._pos])
+
+    def messages(self, fast_mode : bool = True) -> Iterator[_core.IMC_message]:
+        '''Yields the deserialized messages. See network.unpack for fast_mode.'''
+        unpack = _network.unpack
+        for frame in self.frames():
+            yield unpack(frame, fast_mode=fast_mode)
+
+    def __iter__(self) -> Iterator[_core.IMC_message]:
+        return self.messages()
+
+    def frame_statistics(self) -> Optional[dict]:
+        '''Returns the number of frames (that passed the filters) whose size was accepted and rejected, per message id 
+        (see schema.size_validator), or None if validate_size is disabled.'''
+        return self._size_validator.statistics() if self._size_validator is not None else None
+
+    def close(self) -> None:
+        if self._mmap is not None:
+            try:
+                self._view.release()
+                self._mmap.close()
+            except BufferError:
+                # Frames are still referenced elsewhere. The mapping is released when they are garbage collected.
+                pass
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.close()
+
+def iter_lsf(path : str, *, msg_ids : Any = None, src : Optional[Union[int, Iterable[int]]] = None, raw : bool = False,
+                validate_crc : bool = True, use_mmap : bool = False, validate_size : bool = True) -> Iterator[Union[_core.IMC_message, bytes]]:
+    '''Iterates over the messages of a LSF log, synchronously. If raw is True, yields the frames
+    (serialized messages, as bytes) instead of deserialized messages. See log_reader for the other arguments.
+
+    Example:
+        for msg in iter_lsf('Data.lsf', msg_ids=['EstimatedState', 'Temperature']):
+            ...
+    '''
+    with log_reader(path, msg_ids=msg_ids, src=src, validate_crc=validate_crc, use_mmap=use_mmap, validate_size=validate_size) as reader:
+        yield from (reader.frames() if raw else reader.messages())
+
+def merge_logs(logs : Iterable[Union[str, log_reader]], *, msg_ids : Any = None, src : Optional[Union[int, Iterable[int]]] = None,
+                src_ent : Optional[Union[int, Iterable[int]]] = None, raw : bool = False, validate_crc : bool = True,
+                use_mmap : bool = False, validate_size : bool = True) -> Iterator[Union[_core.IMC_message, bytes, memoryview]]:
+    '''Iterates over the messages of several logs (e.g., of different vehicles of a mission) in timestamp order,
+    as a single stream. If raw is True, yields the frames instead of deserialized messages.
+
+    logs are paths or log_readers (which are consumed from their current position and are not closed). It is a
+    k-way merge: only the next frame of each log is held and frames are ordered by the timestamp in their header,
+    so only the yielded messages are deserialized. Each log is assumed to be sorted by timestamp, as written by
+    DUNE; messages with equal timestamps are yielded in the order of the logs. See log_reader for the other arguments.
+    '''
+    opened = []
+    try:
+        readers = []
+        for log in logs:
+            if isinstance(log, log_reader):
+                readers.append(log)
+            else:
+                opened.append(log_reader(log, msg_ids=msg_ids, src=src, src_ent=src_ent, validate_crc=validate_crc, use_mmap=use_mmap,
+                                            validate_size=validate_size))
+                readers.append(opened[-1])
+
+        merged = _heapq.merge(*[reader.frames() for reader in readers], key=lambda frame : _frame_timestamp(frame, 0))
+        if raw:
+            yield from merged
+        else:
+            unpack = _network.unpack
+            for frame in merged:
+                yield unpack(frame, fast_mode=True)
+    finally:
+        for reader in opened:
+            reader.close()
+
+class log_writer:
+    '''
+        Writes frames (serialized messages, as received from the bus or yielded by log_reader) to LSF logs,
+        as they are, without deserializing and serializing them again.
+
+        Logs are laid out like DUNE does: folder/YYYYMMDD/HHMMSS/Data.lsf (UTC time at which the log was started),
+        or Data.lsf.gz, if compress is True, in which case the frames are compressed as they are written (a single
+        gzip stream per log). The paths of the logs written so far are listed in the paths attribute.
+
+        Frames are kept in a buffer, which is written when it reaches buffer_size bytes, when flush_interval seconds
+        have passed since it was last written (checked when a frame is written or poll is called, which subscriber.record
+        does periodically) and when the writer is closed. Whatever was written can be read even if the program is killed
+        afterwards: compressed logs are flushed with Z_SYNC_FLUSH and truncated .gz logs are readable by log_reader.
+
+        If max_size (bytes, before compression) or max_duration (seconds) are given, a new log is started when the
+        current one would exceed them (always at a frame boundary). rotate() forces it.
+    '''
+    __slots__ = ['_folder', '_compress', '_compresslevel', '_buffer_size', '_flush_interval', '_max_size', '_max_duration',
+                    '_buffer', '_file', '_gzip', '_log_size', '_log_start', '_last_flush', 'paths']
+
+    def __init__(self, folder : str, *, compress : bool = False, compresslevel : int = 6, buffer_size : int = 1 << 20,
+                    flush_interval : Optional[float] = 1.0, max_size : Optional[int] = None, max_duration : Optional[float] = None) -> None:
+        self._folder = folder
+        self._compress = compress
+        self._compresslevel = compresslevel
+        self._buffer_size = buffer_size
+        self._flush_interval = flush_interval
+        self._max_size = max_size
+        self._max_duration = max_duration
+
+        self._buffer = bytearray()
+        # current log: opened on the first write
+        self._file = None
+        self._gzip = None
+        self._log_size = 0
+        self._log_start = 0.0
+        self._last_flush = _time.monotonic()
+        self.paths = []
+
+    def _open_log(self) -> None:
+        now = _time.time()
+        folder = _os.path.join(self._folder, _time.strftime('%Y%m%d', _time.gmtime(now)), _time.strftime('%H%M%S', _time.gmtime(now)))
+        # logs started within the same second
+        candidate, n = folder, 0
+        while _os.path.exists(candidate):
+            n += 1
+            candidate = f'{folder}_{n}'
+        _os.makedirs(candidate)
+
+        path = _os.path.join(candidate, 'Data.lsf.gz' if self._compress else 'Data.lsf')
+        self._file = open(path, 'wb')
+        if self._compress:
+            self._gzip = _gzip.GzipFile(fileobj=self._file, mode='wb', compresslevel=self._compresslevel)
+        self._log_size = 0
+        self._log_start = _time.monotonic()
+        self.paths.append(path)
+
+    def write(self, frame : Union[bytes, bytearray, memoryview]) -> None:
+        '''Appends a frame to the current log (see the class description for when it is actually written).'''
+        if self._file is not None and self._log_size > 0 and \
+                ((self._max_size is not None and self._log_size + len(frame) > self._max_size) or 
+                (self._max_duration is not None and _time.monotonic() - self._log_start >= self._max_duration)):
+            self.rotate()
+        if self._file is None:
+            self._open_log()
+
+        self._buffer += frame
+        self._log_size += len(frame)
+        if len(self._buffer) >= self._buffer_size:
+            self.flush()
+        else:
+            self.poll()
+
+    def poll(self) -> None:
+        '''Writes the buffer if flush_interval seconds have passed since it was last written.'''
+        if self._buffer and self._flush_interval is not None and _time.monotonic() - self._last_flush >= self._flush_interval:
+            self.flush()
+
+    def flush(self) -> None:
+        '''Writes the buffer to the current log.'''
+        self._last_flush = _time.monotonic()
+        if self._file is None or not self._buffer:
+            return
+        if self._gzip is not None:
+            self._gzip.write(self._buffer)
+            self._gzip.flush()
+        else:
+            self._file.write(self._buffer)
+        self._file.flush()
+        self._buffer.clear()
+
+    def rotate(self) -> None:
+        '''Closes the current log. The next frame starts a new one.'''
+        self.flush()
+        if self._gzip is not None:
+            self._gzip.close()
+            self._gzip = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def close(self) -> None:
+        self.rotate()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.close()
+
+def _chunk_frames(path : str, start : int, end : int, msg_ids : Optional[set], srcs : Optional[set], src_ents : Optional[set],
+                    validate_crc : bool, validate_size : bool, bounds : list) -> Iterator[bytes]:
+    '''Yields the (valid) frames that start in [start, end[ and pass the filters. The first frame is found by looking 
+    for a sync number followed by a valid CRC, just like a sequential reader would do after garbage. Once the frames
+    are consumed, bounds holds the offset of the first frame (regardless of the filters, None if there is none) and
+    the offset from which a sequential reader would look for the frame that follows the chunk (see _map_chunks).'''
+    bounds[:] = [None, max(start, end)]
+    validator = _schema.size_validator(_pg) if validate_size else None
+    with open(path, 'rb') as f:
+        size = _os.fstat(f.fileno()).st_size
+        if size == 0:
+            return
+        with _mmap.mmap(f.fileno(), 0, access=_mmap.ACCESS_READ) as buffer:
+            pos = start
+            while pos < end:
+                (pos, length) = _find_frame(buffer, pos, size, validate_crc, True)
+                if length == 0 or pos >= end:
+                    return
+                if bounds[0] is None:
+                    bounds[0] = pos
+                bounds[1] = max(pos + length, end)
+                if msg_ids is not None or srcs is not None or src_ents is not None or validator is not None:
+                    mgid, src, src_ent = _header_ids(buffer, pos)
+                    if (msg_ids is not None and mgid not in msg_ids) or (srcs is not None and src not in srcs) \
+                            or (src_ents is not None and src_ent not in src_ents) \
+                            or (validator is not None and not validator(mgid, length - _frame_overhead,
+                                                                        _network.get_package(src) if _network._source_packages else None)):
+                        pos += length
+                        continue
+                yield buffer[pos:pos + length]
+                pos += length
+
+def _decode_chunk(path : str, start : int, end : int, *, func : Optional[Callable], msg_ids : Optional[set], srcs : Optional[set], 
+                    src_ents : Optional[set], validate_crc : bool, validate_size : bool) -> Tuple[list, Optional[int], int]:
+    '''Executed in a worker process (see decode_parallel). Returns the results and the bounds of the chunk (see _chunk_frames).'''
+    bounds = []
+    frames = _chunk_frames(path, start, end, msg_ids, srcs, src_ents, validate_crc, validate_size, bounds)
+    if func is None:
+        return (list(frames), *bounds)
+    unpack = _network.unpack
+    return ([func(unpack(frame, fast_mode=True)) for frame in frames], *bounds)
+
+def _columns_chunk(path : str, start : int, end : int, *, fields : Dict[int, List[str]], srcs : Optional[set], 
+                    src_ents : Optional[set], validate_crc : bool, validate_size : bool) -> Tuple[Dict[int, Dict[str, list]], Optional[int], int]:
+    '''Executed in a worker process (see columns_parallel). Returns the columns and the bounds of the chunk (see _chunk_frames).'''
+    columns = {mgid : {c : [] for c in [*_header_columns, *f]} for mgid, f in fields.items()}
+    unpack = _network.unpack
+    bounds = []
+    for frame in _chunk_frames(path, start, end, set(fields), srcs, src_ents, validate_crc, validate_size, bounds):
+        msg = unpack(frame, fast_mode=True)
+        c = columns[msg.Attributes.id]
+        c['header.timestamp'].append(msg._header.timestamp)
+        c['header.src'].append(msg._header.src)
+        c['header.src_ent'].append(msg._header.src_ent)
+        for field in fields[msg.Attributes.id]:
+            c[field].append(getattr(msg, field))
+    return (columns, *bounds)
+
+def _map_chunks(path : str, worker : Callable, workers : Optional[int], chunk_size : int) -> Iterator[Any]:
+    '''Splits the log in byte ranges, processes them in a process pool and yields the results in the original order,
+    as soon as they are available. Only a few chunks are processed ahead of the consumer, to bound the memory usage.
+
+    Each worker resynchronizes at the start of its range, which is usually inside the last frame of the previous one.
+    Its frames are the ones a sequential reader would find, unless its first frame starts before the previous range
+    actually ended (e.g., a false frame inside that last frame). Then, the range is processed again, in this process,
+    from where the previous one ended.'''
+    if _is_gzip(path):
+        raise ValueError(f'{path} is compressed and cannot be split in chunks. Decompress it or use log_reader.')
+    size = _os.path.getsize(path)
+    workers = workers if workers is not None else (_os.cpu_count() or 1)
+    # offset from which a sequential reader would look for the next frame
+    stop = 0
+    with _futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = _collections.deque()
+        def next_result():
+            nonlocal stop
+            (end, future) = pending.popleft()
+            (results, first, chunk_stop) = future.result()
+            if first is not None and first < stop:
+                (results, first, chunk_stop) = worker(path, stop, end)
+            stop = max(stop, chunk_stop)
+            return results
+
+        for start in range(0, size, chunk_size):
+            end = min(start + chunk_size, size)
+            pending.append((end, executor.submit(worker, path, start, end)))
+            if len(pending) >= 2 * workers:
+                yield next_result()
+        while pending:
+            yield next_result()
+
+def decode_parallel(path : str, func : Optional[Callable[[_core.IMC_message], Any]] = None, *, msg_ids : Any = None, 
+                    src : Optional[Union[int, Iterable[int]]] = None, src_ent : Optional[Union[int, Iterable[int]]] = None,
+                    workers : Optional[int] = None, chunk_size : int = 1 << 24, validate_crc : bool = True, 
+                    validate_size : bool = True) -> Iterator[Any]:
+    '''Decodes a single log using a pool of processes (workers = None means one per processor).
+
+    The log is split in byte ranges of chunk_size bytes. Each worker finds the first frame of its range (sync number + 
+    valid CRC), deserializes the frames that start in it and calls func for each message. A range whose first frame 
+    overlaps the last frame of the previous one is processed again, so the frames are the same as a sequential reader's.
+    The results are yielded in the original order, as the chunks are completed. Since messages cannot be sent back to the main process, func must
+    convert them to something picklable (e.g., a tuple of fields) and must itself be picklable (a function defined at
+    module level). If func is None, the (CRC checked) frames are yielded as bytes.
+
+    See log_reader for the other arguments.
+    '''
+    worker = _functools.partial(_decode_chunk, func=func, msg_ids=_get_msg_ids(msg_ids), srcs=_get_srcs(src), 
+                                    src_ents=_get_srcs(src_ent), validate_crc=validate_crc, validate_size=validate_size)
+    for results in _map_chunks(path, worker, workers, chunk_size):
+        yield from results
+
+def columns_parallel(path : str, fields : Dict[Any, List[str]], *, src : Optional[Union[int, Iterable[int]]] = None, 
+                        src_ent : Optional[Union[int, Iterable[int]]] = None, workers : Optional[int] = None, 
+                        chunk_size : int = 1 << 24, validate_crc : bool = True, validate_size : bool = True) -> Dict[str, Dict[str, list]]:
+    '''Same as decode_parallel, but extracts columns: fields maps messages (ints, classes or abbrevs) to lists of field
+    names, e.g. {'EstimatedState' : ['lat', 'lon', 'depth']}. Returns a dictionary indexed by the message abbrev of 
+    dictionaries of columns (lists), including 'header.timestamp', 'header.src' and 'header.src_ent', concatenated
+    in the original order.'''
+    fields = {mgid : list(f) for m, f in fields.items() for mgid in _get_msg_ids(m)}
+    worker = _functools.partial(_columns_chunk, fields=fields, srcs=_get_srcs(src), src_ents=_get_srcs(src_ent), validate_crc=validate_crc,
+                                    validate_size=validate_size)
+
+    columns = {mgid : {c : [] for c in [*_header_columns, *f]} for mgid, f in fields.items()}
+    for chunk in _map_chunks(path, worker, workers, chunk_size):
+        for mgid, chunk_columns in chunk.items():
+            for c, values in chunk_columns.items():
+                columns[mgid][c].extend(values)
+    return {_pg.messages._message_ids.get(mgid, str(mgid)) : c for mgid, c in columns.items()}
+
+# numpy (base) types of the IMC numeric types. Messages whose fields are all numeric have a fixed layout.
+_numpy_types = {'uint8_t' : 'u1', 'int8_t' : 'i1', 'uint16_t' : 'u2', 'int16_t' : 'i2', 'uint32_t' : 'u4', 'int32_t' : 'i4',
+                'uint64_t' : 'u8', 'int64_t' : 'i8', 'fp32_t' : 'f4', 'fp64_t' : 'f8'}
+_header_fields = [('sync', 'u2'), ('mgid', 'u2'), ('size', 'u2'), ('timestamp', 'f8'), ('src', 'u2'), ('src_ent', 'u1'),
+                    ('dst', 'u2'), ('dst_ent', 'u1')]
+
+def _import_numpy() -> Any:
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError('numpy is required to extract columns (pip install pyimclsts[numpy]).') from None
+    return numpy
+
+def _message_dtype(message_class : Any, big_endian : bool) -> Any:
+    '''Returns the numpy dtype of a whole frame (header, fields and CRC) of a fixed layout message class, 
+    or None if the layout is not fixed. The dtypes are generated with the messages (see pyimc_generated.dtypes); 
+    they are only built here for packages that were generated without them.'''
+    np = _import_numpy()
+    if hasattr(_pg, 'dtypes'):
+        return _pg.dtypes.get_dtype(message_class.Attributes.id, big_endian)
+    layout = _schema.get_layout(message_class)
+    if not layout.is_fixed:
+        return None
+    e = '>' if big_endian else '<'
+    return np.dtype([('header.' + name, e + t) for name, t in _header_fields] + 
+                    [(name, e + _numpy_types[t]) for name, t in layout.types] + [('footer.crc', e + 'u2')])
+
+def _fixed_columns(reader : 'log_reader', positions : List[int], columns : List[str], message_class : Any) -> Dict[str, Any]:
+    '''Extracts the columns of the frames at the given positions of the reader's index, using np.frombuffer.'''
+    np = _import_numpy()
+    index = reader._index
+    dtypes = {e : _message_dtype(message_class, e) for e in (True, False)}
+    frame_size = _schema.get_layout(message_class).frame_size
+
+    positions = np.asarray(positions, dtype=np.int64)
+    lengths = np.frombuffer(index.length, dtype=np.uint32)[positions]
+    if np.any(lengths != frame_size):
+        print(f'Warning: {np.count_nonzero(lengths != frame_size)} {message_class.Attributes.abbrev} messages do not have the expected '
+                f'size ({frame_size} bytes) and were ignored. Was the log written with another IMC version?')
+        positions = positions[lengths == frame_size]
+
+    offsets = np.frombuffer(index.offset, dtype=np.uint64)[positions].astype(np.int64)
+    if reader._mmap is not None:
+        data = np.frombuffer(reader._mmap, dtype=np.uint8)
+    else:
+        # compressed log: concatenate the frames instead
+        frames = []
+        for offset in offsets.tolist():
+            reader._file.seek(offset)
+            frames.append(reader._file.read(frame_size))
+        data = np.frombuffer(b''.join(frames), dtype=np.uint8)
+        offsets = np.arange(len(offsets), dtype=np.int64) * frame_size
+    frames = data[offsets[:, None] + np.arange(frame_size)] if len(offsets) else np.empty((0, frame_size), dtype=np.uint8)
+
+    # Frames may be in either byte order
+    big = frames[:, 0] == _sync_big[0]
+    result = {}
+    for column in columns:
+        base = dtypes[True][column].newbyteorder('=')
+        result[column] = np.empty(len(frames), dtype=base)
+        for e, mask in ((True, big), (False, ~big)):
+            if np.any(mask):
+                result[column][mask] = np.ascontiguousarray(frames[mask]).view(dtypes[e])[column][:, 0]
+    return result
+
+def _decoded_columns(reader : 'log_reader', positions : List[int], columns : List[str], message_class : Any) -> Dict[str, Any]:
+    '''Extracts the columns of the frames at the given positions of the reader's index, by deserializing them.'''
+    np = _import_numpy()
+    types = dict(_schema.get_layout(message_class).types)
+    values = {column : [] for column in columns}
+    unpack = _network.unpack
+    validator = _schema.size_validator(_pg)
+    for i in positions:
+        if not validator(reader._index.mgid[i], reader._index.length[i] - _frame_overhead):
+            continue
+        reader._file.seek(reader._index.offset[i])
+        frame = reader._file.read(reader._index.length[i])
+        msg = unpack(frame, fast_mode=True)
+        for column in columns:
+            if column.startswith('header.'):
+                values[column].append(getattr(msg._header, column[7:]))
+            else:
+                values[column].append(getattr(msg, column))
+    if validator.rejected:
+        print(f'Warning: {sum(validator.rejected.values())} {message_class.Attributes.abbrev} messages are smaller than the minimum '
+                f'size ({_schema.get_layout(message_class).min_frame_size} bytes) and were ignored. Was the log written with another IMC version?')
+    result = {}
+    for column in columns:
+        if column.startswith('header.'):
+            dtype = dict(_header_fields)[column[7:]]
+        else:
+            dtype = _numpy_types.get(types[column], object)
+        result[column] = np.array(values[column], dtype=dtype) if dtype is not object else np.empty(len(values[column]), dtype=object)
+        if dtype is object:
+            result[column][:] = values[column]
+    return result
+
+# Bump when the layout of the column cache changes
+_cache_version = 1
+
+def default_cache_dir(path : str) -> str:
+    '''The column cache is stored next to the log: Data.lsf -> Data.lsf.cache/'''
+    return path + '.cache'
+
+def _schema_digest(message_class : Any) -> str:
+    '''Digest of the definition of a message (id, abbrev, fields and their types), so that cached columns are
+    not used by a different IMC version.'''
+    definition = (_cache_version, message_class.Attributes.id, message_class.Attributes.abbrev, 
+                    list(_schema.get_layout(message_class).types))
+    return _hashlib.blake2b(repr(definition).encode(), digest_size=8).hexdigest()
+
+def _cache_file(log_dir : str, message_class : Any, column : str) -> str:
+    return _os.path.join(log_dir, message_class.Attributes.abbrev + '.' + _schema_digest(message_class), column + '.npy')
+
+def _save_column(file : str, values : Any) -> None:
+    np = _import_numpy()
+    _os.makedirs(_os.path.dirname(file), exist_ok=True)
+    # write and rename, so that concurrent readers never see a partial file
+    tmp = f'{file}.{_os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        np.save(f, values, allow_pickle=values.dtype == object)
+    _os.replace(tmp, file)
+
+def _load_column(file : str) -> Any:
+    np = _import_numpy()
+    try:
+        return np.load(file, mmap_mode='r')
+    except ValueError:
+        # object arrays (pickled) and empty arrays cannot be memory-mapped
+        return np.load(file, allow_pickle=True)
+
+def _extract(path : str, requested : Dict[str, Tuple[Any, List[str]]], src : Any, src_ent : Any, 
+                index : Optional[frame_index]) -> Dict[str, Dict[str, Any]]:
+    '''Extracts the requested columns: abbrev -> (message class, columns).'''
+    if index is None:
+        index = build_index(path, save=False)
+
+    result = {}
+    with log_reader(path, index=index, use_mmap=True) as reader:
+        for abbrev, (message_class, columns) in requested.items():
+            positions = index.select(msg_ids=message_class.Attributes.id, src=src, src_ent=src_ent)
+            if _schema.get_layout(message_class).is_fixed:
+                result[abbrev] = _fixed_columns(reader, positions, columns, message_class)
+            else:
+                result[abbrev] = _decoded_columns(reader, positions, columns, message_class)
+    return result
+
+def _cached_extract(path : str, requested : Dict[str, Tuple[Any, List[str]]], src : Any, src_ent : Any, 
+                    index : Optional[frame_index], cache_dir : str) -> Dict[str, Dict[str, Any]]:
+    '''Same as _extract, but through the column cache. Columns are cached for all the messages of a type 
+    (the filters are applied afterwards), so that they can be reused with other filters.'''
+    np = _import_numpy()
+    st = _os.stat(path)
+    # The digest only samples the log: its modification time also changes when it is edited in the middle
+    log_key = _hashlib.blake2b(_log_digest(path, st.st_size) + st.st_mtime_ns.to_bytes(8, byteorder='little', signed=True), 
+                                digest_size=32).hexdigest()
+    log_dir = _os.path.join(cache_dir, log_key)
+
+    missing = {}
+    for abbrev, (message_class, columns) in requested.items():
+        m = [c for c in columns if not _os.path.isfile(_cache_file(log_dir, message_class, c))]
+        if m:
+            # header columns are needed to apply the filters on load
+            missing[abbrev] = (message_class, list(dict.fromkeys(_header_columns + m)))
+
+    if missing:
+        # Columns of a previous version of the log are removed
+        if _os.path.isdir(cache_dir):
+            for entry in _os.listdir(cache_dir):
+                if entry != log_key and len(entry) == len(log_key) and all(c in '0123456789abcdef' for c in entry):
+                    _shutil.rmtree(_os.path.join(cache_dir, entry), ignore_errors=True)
+        for abbrev, columns in _extract(path, missing, None, None, index).items():
+            message_class = missing[abbrev][0]
+            for column, values in columns.items():
+                _save_column(_cache_file(log_dir, message_class, column), values)
+
+    srcs = _get_srcs(src)
+    src_ents = _get_srcs(src_ent)
+    result = {}
+    for abbrev, (message_class, columns) in requested.items():
+        result[abbrev] = {c : _load_column(_cache_file(log_dir, message_class, c)) for c in columns}
+        if srcs is not None or src_ents is not None:
+            mask = np.ones(len(result[abbrev]['header.src']), dtype=bool)
+            if srcs is not None:
+                mask &= np.isin(result[abbrev]['header.src'], list(srcs))
+            if src_ents is not None:
+                mask &= np.isin(result[abbrev]['header.src_ent'], list(src_ents))
+            result[abbrev] = {c : values[mask] for c, values in result[abbrev].items()}
+    return result
+
+def extract_columns(path : str, fields : Dict[Any, Optional[List[str]]], *, src : Optional[Union[int, Iterable[int]]] = None, 
+                    src_ent : Optional[Union[int, Iterable[int]]] = None, index : Optional[frame_index] = None, 
+                    dataframe : bool = False, cache : bool = False, cache_dir : Optional[str] = None) -> Dict[str, Any]:
+    '''Extracts fields of messages of a log as numpy arrays (numpy is an optional dependency).
+
+    fields maps messages (ints, classes or abbrevs) to lists of field names (None means all fields), e.g.
+    {'EstimatedState' : ['lat', 'lon', 'depth']}. Returns a dictionary indexed by the message abbrev of dictionaries
+    of columns (1-D arrays), including 'header.timestamp', 'header.src' and 'header.src_ent', in the order of the log.
+    If dataframe is True, pandas DataFrames are returned instead of dictionaries of columns.
+
+    Messages whose fields are all numeric have a fixed layout: their frames are gathered and decoded at once, as a 
+    numpy structured array. Other messages are deserialized one by one; their fields of non-numeric types (e.g., 
+    plaintext or inline messages) become object arrays.
+
+    index is the frame index of the log (see load_index). If it is not given, the log is scanned to build one, 
+    which is not saved.
+
+    If cache is True, the columns are stored in cache_dir (see default_cache_dir) as .npy files, keyed by a digest
+    of the log (its size, modification time and first and last MiB) and of the message definitions, and later calls load them (memory-mapped, when possible) instead of
+    reading the log. Only the missing columns are extracted. Columns cached for a previous version of the log are
+    removed when new ones are written.
+    '''
+    _import_numpy()
+    requested = {}
+    for m, message_fields in fields.items():
+        for mgid in _get_msg_ids(m):
+            abbrev = _pg.messages._message_ids[mgid]
+            message_class = getattr(_pg.messages, abbrev)
+            names = list(message_fields) if message_fields is not None else list(message_class.Attributes.fields)
+            unknown = [field for field in names if field not in message_class.Attributes.fields]
+            if unknown:
+                raise ValueError(f'{abbrev} has no field(s) {unknown}.')
+            requested[abbrev] = (message_class, _header_columns + names)
+
+    if cache:
+        cache_dir = cache_dir if cache_dir is not None else default_cache_dir(path)
+        result = _cached_extract(path, requested, src, src_ent, index, cache_dir)
+    else:
+        result = _extract(path, requested, src, src_ent, index)
+
+    if dataframe:
+        try:
+            import pandas
+        except ImportError:
+            raise ImportError('pandas is required to return DataFrames (pip install pyimclsts[pandas]).') from None
+        result = {abbrev : pandas.DataFrame(columns) for abbrev, columns in result.items()}
+    return result
+
+if __name__ == '__main__':
+    argparser = argparse.ArgumentParser(description='Tools for LSF logs.')
+    subparsers = argparser.add_subparsers(dest='command')
+    index_parser = subparsers.add_parser('index', help='Builds the frame index (.idx file) of the given logs, unless it is up to date.')
+    index_parser.add_argument('logs', nargs='+', help='Paths to the logs (Data.lsf)')
+    index_parser.add_argument('-f', '--force', action='store_true', help='Rebuild the index even if it is up to date')
+    merge_parser = subparsers.add_parser('merge', help='Merges the given logs into a single one, in timestamp order.')
+    merge_parser.add_argument('output', help='Path to the merged log')
+    merge_parser.add_argument('logs', nargs='+', help='Paths to the logs (Data.lsf or Data.lsf.gz)')
+
+    args = argparser.parse_args()
+
+    if args.command == 'index':
+        for log in args.logs:
+            index = build_index(log) if args.force else load_index(log)
+            print(f'{log}: {len(index)} frames indexed.')
+    elif args.command == 'merge':
+        n = 0
+        with open(args.output, 'wb') as f:
+            for frame in merge_logs(args.logs, raw=True):
+                f.write(frame)
+                n += 1
+        print(f'{args.output}: {n} frames merged from {len(args.logs)} logs.')
+    else:
+        argparser.print_help()
@@ -2,37 +2,180 @@
     Contains classes that allows the user to connect to the network, 
     send and receive messages.
 '''
-from typing import Callable, Union, Optional, Tuple, Any
+from __future__ import annotations
+
+from typing import Callable, Union, Optional, Tuple, List, Any
 import functools as _functools
 import inspect as _inspect
 import types as _types
+import collections as _collections
 
 import multiprocessing as _multiprocessing
+import concurrent.futures as _futures
 import asyncio as _asyncio
 import time as _time
 
 import importlib.util as _import
+import zipimport as _zipimport
 import sys as _sys
 import os as _os
+import json as _json
 
 import pyimclsts.core as _core
+import pyimclsts.schema as _schema
 
 _module_name = 'pyimc_generated' # and folder name
-_location = _os.getcwd() + '/' + _module_name + '/__init__.py'
-
-_spec = _import.spec_from_file_location(_module_name, _location)
-
-_pg = _import.module_from_spec(_spec)
-_sys.modules[_module_name] = _pg
-_spec.loader.exec_module(_pg)
-
-def unpack(message : bytes, *, is_big_endian : Optional[bool] = None, is_field_message : bool = False, fast_mode : bool = False) -> Any:
+# Folder of the generated package. See set_generated_location.
+_location = _os.environ.get('PYIMCLSTS_GENERATED', _os.path.join(_os.getcwd(), _module_name))
+
+class _lazy_package(_types.ModuleType):
+    '''Placeholder of the generated package, which is only loaded when one of its attributes is first used
+    (e.g., _pg.messages). The package is executed in this same module object, which then becomes a regular 
+    module: references to it (including import pyimc_generated) remain valid and cost nothing afterwards.'''
+
+    def __getattr__(self, name : str) -> Any:
+        _load_generated()
+        return getattr(self, name)
+
+def _package_spec(name : str, location : str) -> Any:
+    '''Spec of the generated package in the given folder, or bundle (a zip archive, see the --bundle option of 
+    pyimclsts.extract), whose modules are loaded from their precompiled bytecode by zipimport.'''
+    if _os.path.isfile(location):
+        spec = _import.spec_from_loader(name, _zipimport.zipimporter(location), origin=location, is_package=True)
+        # The modules of the package are at the root of the bundle
+        spec.submodule_search_locations.append(location)
+        return spec
+    return _import.spec_from_file_location(name, _os.path.join(location, '__init__.py'))
+
+def _exec_package(spec : Any, package : _types.ModuleType) -> None:
+    if isinstance(spec.loader, _zipimport.zipimporter):
+        # (the zipimporter would look the package up by its name, but its __init__ is at the root of the bundle)
+        exec(spec.loader.get_code('__init__'), package.__dict__)
+    else:
+        spec.loader.exec_module(package)
+
+def _load_generated() -> None:
+    if type(_pg) is not _lazy_package:
+        return
+    spec = _package_spec(_module_name, _location)
+    # A regular module from now on, so that missing attributes do not trigger the loading again
+    _pg.__class__ = _types.ModuleType
+    _pg.__spec__ = spec
+    _pg.__loader__ = spec.loader
+    _pg.__file__ = spec.origin
+    _pg.__path__ = spec.submodule_search_locations
+    _pg.__package__ = _module_name
+    try:
+        _exec_package(spec, _pg)
+    except BaseException:
+        _pg.__class__ = _lazy_package
+        raise
+
+def set_generated_location(folder : str) -> None:
+    '''Sets the folder (or bundle) of the generated package (see pyimclsts.extract). By default, it is ./pyimc_generated
+    or the value of the PYIMCLSTS_GENERATED environment variable. Since the package is loaded on first use, this can
+    be called after the import of pyimclsts, but not after the package has been used. The location is also 
+    exported to the environment, so that worker processes load the same package.'''
+    global _location
+    if type(_pg) is not _lazy_package:
+        raise RuntimeError(f'{_module_name} has already been loaded from {_pg.__file__}.')
+    _location = folder
+    _os.environ['PYIMCLSTS_GENERATED'] = folder
+
+if _module_name in _sys.modules:
+    _pg = _sys.modules[_module_name]
+else:
+    _pg = _lazy_package(_module_name)
+    _sys.modules[_module_name] = _pg
+
+# Other generated packages (e.g., of other IMC versions): real path of their folder -> module. See load_package.
+_packages = dict()
+# Source system -> package (or its folder, until it is first used) that decodes its messages. See set_source_packages.
+_source_packages = dict()
+
+def load_package(folder : str) -> _types.ModuleType:
+    '''Loads the generated package in the given folder or bundle (see the --output and --bundle options of 
+    pyimclsts.extract), for example, 
+    of another IMC version. Each package is loaded once, as a separate module with its own message classes (and thus,
+    layouts, see pyimclsts.schema), so that several versions can be used side by side. The folder of the default
+    package returns the default package.'''
+    location = _os.path.realpath(folder)
+    if location == _os.path.realpath(_location):
+        return _pg
+    package = _packages.get(location, None)
+    if package is None:
+        # The module name only needs to be unique: the generated modules import each other relatively
+        name = _os.path.splitext(_os.path.basename(location))[0]
+        name = name if name.isidentifier() else _module_name
+        unique_name = name
+        n = 1
+        while unique_name in _sys.modules:
+            n += 1
+            unique_name = f'{name}_{n}'
+        spec = _package_spec(unique_name, location)
+        package = _import.module_from_spec(spec)
+        _sys.modules[unique_name] = package
+        try:
+            _exec_package(spec, package)
+        except BaseException:
+            del _sys.modules[unique_name]
+            raise
+        _packages[location] = package
+    return package
+
+def _package_location(package : Union[str, _types.ModuleType]) -> str:
+    '''Folder or bundle of a generated package (see load_package), given as a module or as its location.'''
+    if isinstance(package, str):
+        return package
+    if package is _pg and type(_pg) is _lazy_package:
+        return _location
+    # (a bundle is the search location of its own modules, see _package_spec)
+    path = getattr(package, '__path__', None)
+    if not path:
+        raise ValueError(f'{package!r} is not a generated package loaded from a folder or bundle.')
+    return path[0]
+
+def set_source_packages(packages : dict) -> None:
+    '''Decodes the messages of the given source systems with other generated packages: packages maps system ids (ints)
+    to packages or their folders (see load_package). The messages of the other systems are decoded with the default 
+    package. Since unpack chooses the package by the source of the message, this applies to the subscriber and to the
+    log readers (pyimclsts.lsf), so that a single process can decode the messages of vehicles that run different IMC
+    versions. Replaces the previous mapping. The locations of the packages are also exported to the environment, so 
+    that worker processes use the same mapping; packages given as modules must thus have been loaded from a folder or
+    bundle (ValueError otherwise).'''
+    locations = {int(src) : _package_location(package) for src, package in packages.items()}
+    _source_packages.clear()
+    for src, package in packages.items():
+        _source_packages[int(src)] = load_package(package) if isinstance(package, str) else package
+    _os.environ['PYIMCLSTS_SOURCE_PACKAGES'] = _json.dumps(locations)
+
+def get_package(src : Optional[int] = None) -> _types.ModuleType:
+    '''Returns the package that decodes the messages of the given source system (see set_source_packages).'''
+    package = _source_packages.get(src, _pg)
+    if isinstance(package, str):
+        package = load_package(package)
+        _source_packages[src] = package
+    return package
+
+if 'PYIMCLSTS_SOURCE_PACKAGES' in _os.environ:
+    # (loaded on first use, see get_package)
+    _source_packages.update({int(src) : folder for src, folder in _json.loads(_os.environ['PYIMCLSTS_SOURCE_PACKAGES']).items()})
+
+def unpack(message : bytes, *, is_big_endian : Optional[bool] = None, is_field_message : bool = False, fast_mode : bool = False,
+            package : Optional[_types.ModuleType] = None) -> Any:
     '''Expects a serializable (= exactly long (header + fields + CRC)) string of bits whose CRC has already been checked
+    It can be given as any bytes-like object. In particular, a memoryview avoids copying the remaining bytes for every field.
     
     Fast mode skips all type checking performed by the descriptor by directly invoking the constructor.
+
+    package is the generated package whose messages are instantiated (see load_package). By default, it is chosen by
+    the source system of the message (see set_source_packages).
     '''
+    if package is None:
+        package = get_package(_get_id_src_src_ent(message)[1]) if _source_packages and not is_field_message else _pg
+
     if is_big_endian is None:
-        is_big_endian = int.from_bytes(message[:2], byteorder='big') == _pg._base._sync_number
+        is_big_endian = int.from_bytes(message[:2], byteorder='big') == package._base._sync_number
         # Note: is_big_endian is a function parameter to enable recursion
     
     unpack_functions = _core.unpack_functions_big if is_big_endian else _core.unpack_functions_little
@@ -41,32 +184,32 @@ def unpack(message : bytes, *, is_big_endian : Optional[bool] = None, is_field_m
     if not is_field_message:
         # deserialize header
         (m, size) = unpack_functions['header'](message[cursor:])
-        deserialized_header = _pg._base.header_data(*m)
+        deserialized_header = package._base.header_data(*m)
         cursor += size
     
         msgid = deserialized_header.mgid
-        if msgid not in _pg.messages._message_ids:
-            unknown_msg = _pg.messages.Unknown(msgid, contents = message[cursor:-2], endianness = is_big_endian)
+        if msgid not in package.messages._message_ids:
+            unknown_msg = package.messages.Unknown(msgid, contents = bytes(message[cursor:-2]), endianness = is_big_endian)
             unknown_msg._header = deserialized_header
             return unknown_msg
     else:
         msgid = unpack_functions['uint16_t'](message[cursor:cursor+2])[0]
         cursor += 2
-        if msgid not in _pg.messages._message_ids:
+        if msgid not in package.messages._message_ids:
             raise KeyError(f'Cannot parse/unpack an unknown inlined message (no information about the size). Add message id {msgid} to extract list')
     
     if fast_mode:
         # get corresponding class
-        message_class = getattr(_pg.messages, _pg.messages._message_ids.get(msgid, None))
+        message_class = getattr(package.messages, package.messages._message_ids.get(msgid, None))
 
-        fields = [(f, getattr(getattr(type(message_class()), f), '_field_def')['type']) for f in message_class().Attributes.fields]
+        fields = _schema.get_layout(message_class).types
         arguments = dict()
         for field, t in fields:
             if t == 'message':
                 if unpack_functions['uint16_t'](message[cursor:cursor+2])[0] == 65535:
                     cursor += 2
                 else:
-                    (m, size) = unpack(message[cursor:], is_big_endian=is_big_endian, is_field_message=True, fast_mode=fast_mode)
+                    (m, size) = unpack(message[cursor:], is_big_endian=is_big_endian, is_field_message=True, fast_mode=fast_mode, package=package)
                     arguments[field] = m
                     cursor += size
             elif t == 'message-list':
@@ -74,7 +217,7 @@ def unpack(message : bytes, *, is_big_endian : Optional[bool] = None, is_field_m
                 cursor += 2
                 arguments[field] = []
                 for _ in range(n):
-                    (m, size) = unpack(message[cursor:], is_big_endian=is_big_endian, is_field_message=True, fast_mode=fast_mode)
+                    (m, size) = unpack(message[cursor:], is_big_endian=is_big_endian, is_field_message=True, fast_mode=fast_mode, package=package)
                     arguments[field].append(m)
                     cursor += size
             else:
@@ -86,17 +229,17 @@ def unpack(message : bytes, *, is_big_endian : Optional[bool] = None, is_field_m
         
     else:
         # instantiate empty class
-        message_class = getattr(_pg.messages, _pg.messages._message_ids.get(msgid, None))()
+        message_class = getattr(package.messages, package.messages._message_ids.get(msgid, None))()
 
         # deserialize fields
         # make a (field, type) tuple list, get information in the descriptor
-        fields = [(f, getattr(getattr(type(message_class), f), '_field_def')['type']) for f in message_class.Attributes.fields]
+        fields = _schema.get_layout(message_class).types
         for field, t in fields:
             if t == 'message':
                 if unpack_functions['uint16_t'](message[cursor:cursor+2])[0] == 65535:
                     cursor += 2
                 else:
-                    (m, size) = unpack(message[cursor:], is_big_endian=is_big_endian, is_field_message=True, fast_mode=fast_mode)
+                    (m, size) = unpack(message[cursor:], is_big_endian=is_big_endian, is_field_message=True, fast_mode=fast_mode, package=package)
                     cursor += size
                     setattr(message_class, field, m)
             elif t == 'message-list':
@@ -104,7 +247,7 @@ def unpack(message : bytes, *, is_big_endian : Optional[bool] = None, is_field_m
                 cursor += 2
                 message_list = []
                 for _ in range(n):
-                    (m, size) = unpack(message[cursor:], is_big_endian=is_big_endian, is_field_message=True, fast_mode=fast_mode)
+                    (m, size) = unpack(message[cursor:], is_big_endian=is_big_endian, is_field_message=True, fast_mode=fast_mode, package=package)
                     message_list.append(m)
                     cursor += size
                 setattr(message_class, field, message_list)
@@ -132,6 +275,13 @@ def _get_id_src_src_ent(message : bytes) -> Tuple[int, int, int]:
         
         return (id, src, src_ent)
 
+def _get_timestamp(message : bytes) -> float:
+    '''Peeks the header timestamp of a serialized message.'''
+    if int.from_bytes(message[:2], byteorder='big') == _pg._base._sync_number:
+        return _core.unpack_functions_big['fp64_t'](message[6:14])[0]
+    else:
+        return _core.unpack_functions_little['fp64_t'](message[6:14])[0]
+
 # Re-export some classes:
 
 tcp_interface = _core.tcp_interface
@@ -171,6 +321,14 @@ class _message_bus():
                         dst : Optional[int] = None, dst_ent : Optional[int] = None) -> None:
         raise NotImplemented
 
+    def send_raw(self, byte_string : bytes) -> None:
+        '''Sends an already serialized message (header + fields + CRC), as is.'''
+        if not self._block_outgoing:
+            self._send_raw(byte_string)
+
+    def _send_raw(self, byte_string : bytes) -> None:
+        raise NotImplemented
+
 class message_bus(_message_bus):
     '''
         Send and receives messages as bytes, but exposes them as IMC messages
@@ -313,6 +471,9 @@ class message_bus(_message_bus):
         self._parent_end.send_bytes(message.pack(is_big_endian=self._big_endian, src = src, src_ent = src_ent, 
                         dst = dst, dst_ent = dst_ent))
 
+    def _send_raw(self, byte_string : bytes) -> None:
+        self._parent_end.send_bytes(byte_string)
+
     def recv(self) -> _pg._base.base_message:
         '''Wrapper around a queue (actually a pipe end). Blocks until a message is available.
         The _external_listener_loop is supposed to send complete messages (as per multiprocessing 
@@ -455,6 +616,9 @@ class message_bus_st(_message_bus):
         self._writer_queue.put_nowait(message.pack(is_big_endian=self._big_endian, src = src, src_ent = src_ent, 
                         dst = dst, dst_ent = dst_ent))
 
+    def _send_raw(self, byte_string : bytes) -> None:
+        self._writer_queue.put_nowait(byte_string)
+
     async def recv(self) -> _pg._base.base_message:
         '''Wrapper around a queue (actually a pipe end). Blocks until a message is available.
         The _external_listener_loop is supposed to send complete messages (as per multiprocessing 
@@ -480,11 +644,332 @@ class message_bus_st(_message_bus):
         print('Message bus event loop has been closed.')
         return None
 
-class subscriber:
+def _mp_worker(callback : Callable, frames : List[bytes], big_endian : bool) -> List[bytes]:
+    '''All code bellow is executed in a worker process of the subscriber's process pool.
+
+    Deserializes a batch of (CRC checked) frames and calls the callback for each of them. The messages
+    given to the send callback are serialized here and returned, so that the main process can write
+    them to the message bus.
+    '''
+    outgoing = []
+    def send(message : _core.IMC_message, *, src : Optional[int] = None, src_ent : Optional[int] = None,
+                        dst : Optional[int] = None, dst_ent : Optional[int] = None) -> None:
+        outgoing.append(message.pack(is_big_endian=big_endian, src = src, src_ent = src_ent, dst = dst, dst_ent = dst_ent))
+
+    if _inspect.iscoroutinefunction(callback):
+        async def run_batch():
+            for frame in frames:
+                await callback(unpack(frame, fast_mode=True), send)
+        _asyncio.run(run_batch())
+    else:
+        for frame in frames:
+            callback(unpack(frame, fast_mode=True), send)
+    return outgoing
+
+class _mp_batcher:
+    '''Collects the raw frames of a subscribe_mp subscription and ships them, in batches, to the
+    subscriber's process pool.
+
+    A batch is submitted once it is full or when the message bus has been drained (see subscriber._flush),
+    so that a slow stream does not hold messages back. The number of batches in flight is bounded:
+    when the limit is reached, the event loop waits for the oldest one, i.e., back pressure.
+    '''
+    __slots__ = ['_callback', '_get_pool', '_msg_manager', '_batch_size', '_max_pending', '_batch', '_pending']
+
+    def __init__(self, callback : Callable, get_pool : Callable[[], _futures.Executor], msg_manager : _message_bus, batch_size : int, max_pending : int) -> None:
+        self._callback = callback
+        self._get_pool = get_pool
+        self._msg_manager = msg_manager
+        self._batch_size = batch_size
+        self._max_pending = max_pending
+        self._batch = []
+        self._pending = set()
+
+    async def __call__(self, frame : bytes, send_callback : Callable) -> None:
+        self._batch.append(frame)
+        if len(self._batch) >= self._batch_size:
+            await self.flush(send_callback)
+
+    async def flush(self, send_callback : Callable) -> None:
+        '''Submits the current (possibly incomplete) batch.'''
+        if not self._batch:
+            return
+
+        if len(self._pending) >= self._max_pending:
+            await _asyncio.wait(self._pending, return_when=_asyncio.FIRST_COMPLETED)
+
+        batch, self._batch = self._batch, []
+        loop = _asyncio.get_running_loop()
+        future = loop.run_in_executor(self._get_pool(), _mp_worker, self._callback, batch, self._msg_manager._big_endian)
+        self._pending.add(future)
+        future.add_done_callback(self._deliver)
+
+    def _deliver(self, future : _asyncio.Future) -> None:
+        '''Writes the messages sent by the worker to the message bus.'''
+        self._pending.discard(future)
+        try:
+            outgoing = future.result()
+        except Exception as e:
+            print(f'Warning: subscribe_mp callback {self._callback} raised {e!r}')
+            return
+
+        for byte_string in outgoing:
+            self._msg_manager.send_raw(byte_string)
+
+    async def close(self, send_callback : Callable) -> None:
+        '''Submits the last batch and waits for every batch in flight.'''
+        await self.flush(send_callback)
+        if self._pending:
+            await _asyncio.wait(self._pending)
+
+def _threadsafe_send(send_callback : Callable) -> Callable:
+    '''Wraps the send callback so that it can be called from another thread (the message bus is not thread-safe):
+    the message is handed over to the running event loop, which sends it.'''
+    loop = _asyncio.get_running_loop()
+    def send(message : _core.IMC_message, *, src : Optional[int] = None, src_ent : Optional[int] = None,
+                    dst : Optional[int] = None, dst_ent : Optional[int] = None) -> None:
+        loop.call_soon_threadsafe(_functools.partial(send_callback, message, src = src, src_ent = src_ent, dst = dst, dst_ent = dst_ent))
+    return send
+
+class _rate_gate:
+    '''Decimates a subscription using only the header of the frames, that is, before deserialization, so
+    that skipped messages cost (almost) nothing. 
+
+    Each (message id, src, src_ent) stream is decimated independently: only every n-th message is let
+    through and/or at most one message per period (evaluated on the header timestamp, so that it also
+    works when replaying logs).
+    '''
+    __slots__ = ['_callback', '_period', '_every_nth', '_last', '_count']
+
+    def __init__(self, callback : Callable, max_rate : Optional[float], every_nth : Optional[int]) -> None:
+        self._callback = callback
+        self._period = 1 / max_rate if max_rate is not None else None
+        self._every_nth = every_nth
+        self._last = dict()
+        self._count = dict()
+
+    async def __call__(self, frame : bytes, send_callback : Callable) -> None:
+        key = _get_id_src_src_ent(frame)
+        if self._every_nth is not None:
+            count = self._count.get(key, 0)
+            self._count[key] = count + 1
+            if count % self._every_nth != 0:
+                return
+
+        if self._period is not None:
+            timestamp = _get_timestamp(frame)
+            last = self._last.get(key, None)
+            # a timestamp that goes backwards (e.g. clock reset, concatenated logs) restarts the count
+            if last is not None and 0 <= timestamp - last < self._period:
+                return
+            self._last[key] = timestamp
+
+        await self._callback(unpack(frame, fast_mode=True), send_callback)
+
+class _thread_dispatcher:
+    '''Runs the callback of a subscribe_thread subscription in the subscriber's thread pool.
+
+    Frames are queued by the event loop and consumed by (at most) one job at a time, which means that 
+    the callback is called in the order the messages were received and never concurrently with itself,
+    while the event loop keeps reading the message bus. Frames are deserialized in the worker thread.
+    The queue is bounded: when it holds max_queued frames, the event loop waits for the job to consume
+    them, i.e., back pressure.
+    '''
+    __slots__ = ['_callback', '_get_pool', '_max_queued', '_queue', '_job']
+
+    def __init__(self, callback : Callable, get_pool : Callable[[], _futures.Executor], max_queued : Optional[int]) -> None:
+        self._callback = callback
+        self._get_pool = get_pool
+        self._max_queued = max_queued
+        self._queue = _collections.deque()
+        self._job = None
+
+    async def __call__(self, frame : bytes, send_callback : Callable) -> None:
+        while self._max_queued is not None and len(self._queue) >= self._max_queued and self._job is not None:
+            await self._wait()
+        self._queue.append(frame)
+        if self._job is None:
+            self._start(send_callback)
+
+    def _start(self, send_callback : Callable) -> None:
+        loop = _asyncio.get_running_loop()
+        self._job = loop.run_in_executor(self._get_pool(), self._consume, _threadsafe_send(send_callback))
+        self._job.add_done_callback(_functools.partial(self._done, send_callback))
+
+    def _consume(self, send : Callable) -> None:
+        '''Executed in a worker thread.'''
+        while self._queue:
+            frame = self._queue.popleft()
+            try:
+                self._callback(unpack(frame, fast_mode=True), send)
+            except Exception as e:
+                print(f'Warning: subscribe_thread callback {self._callback} raised {e!r}')
+
+    async def _wait(self) -> None:
+        '''Waits for the current job and for its _done callback.'''
+        job = self._job
+        await job
+        # Awaiting a finished future does not yield: _done may still be scheduled
+        while self._job is job:
+            await _asyncio.sleep(0)
+
+    def _done(self, send_callback : Callable, future : _asyncio.Future) -> None:
+        # Executed in the event loop. Frames may have been queued after the job found the queue empty.
+        self._job = None
+        if self._queue:
+            self._start(send_callback)
+
+    async def flush(self, send_callback : Callable) -> None:
+        pass
+
+    async def close(self, send_callback : Callable) -> None:
+        '''Waits until every queued frame has been consumed.'''
+        while self._job is not None:
+            await self._wait()
+
+class _conflator:
+    '''Keeps only the latest frame of each (message id, src, src_ent) of a subscribe_latest subscription.
+
+    Frames are stored in a single slot per key, overwriting the pending one, and delivered by a background
+    task. While the callback is busy, the event loop keeps reading the bus, so when the callback is ready
+    it receives the most recent message of each key. Frames are deserialized only when delivered.
+    Regular (non-coroutine) callbacks are executed in the subscriber's thread pool, so that they do not
+    block the event loop while they are busy.
+    '''
+    __slots__ = ['_callback', '_get_pool', '_slots', '_task']
+
+    def __init__(self, callback : Callable, get_pool : Callable[[], _futures.Executor]) -> None:
+        self._callback = callback
+        self._get_pool = get_pool
+        self._slots = dict()
+        self._task = None
+
+    async def __call__(self, frame : bytes, send_callback : Callable) -> None:
+        self._slots[_get_id_src_src_ent(frame)] = frame
+        if self._task is None:
+            self._task = _asyncio.get_running_loop().create_task(self._deliver(send_callback))
+
+    async def _deliver(self, send_callback : Callable) -> None:
+        loop = _asyncio.get_running_loop()
+        try:
+            while self._slots:
+                # oldest pending key first
+                key = next(iter(self._slots))
+                msg = unpack(self._slots.pop(key), fast_mode=True)
+                try:
+                    if _inspect.iscoroutinefunction(self._callback):
+                        await self._callback(msg, send_callback)
+                    else:
+                        await loop.run_in_executor(self._get_pool(), self._callback, msg, _threadsafe_send(send_callback))
+                except Exception as e:
+                    print(f'Warning: subscribe_latest callback {self._callback} raised {e!r}')
+        finally:
+            self._task = None
+
+    async def flush(self, send_callback : Callable) -> None:
+        pass
+
+    async def close(self, send_callback : Callable) -> None:
+        '''Waits until the pending frames have been delivered.'''
+        while self._task is not None:
+            await self._task
+
+class _batcher:
+    '''Delivers the messages of a subscribe_batch subscription in lists (or columns).
+
+    A batch is delivered when it reaches max_size messages or max_delay seconds after its first message.
+    Frames are deserialized only when the batch is delivered. Batches are delivered one at a time, in order:
+    each delivery waits for the one started by the last timer (_task).
+    '''
+    __slots__ = ['_callback', '_max_size', '_max_delay', '_fields', '_batch', '_first', '_timer', '_task']
+
+    def __init__(self, callback : Callable, max_size : int, max_delay : Optional[float], fields : Optional[List[str]]) -> None:
+        self._callback = callback
+        self._max_size = max_size
+        self._max_delay = max_delay
+        self._fields = fields
+        self._batch = []
+        self._first = None
+        self._timer = None
+        self._task = None
+
+    async def __call__(self, frame : bytes, send_callback : Callable) -> None:
+        self._batch.append(frame)
+        if len(self._batch) == 1 and self._max_delay is not None:
+            loop = _asyncio.get_running_loop()
+            self._first = loop.time()
+            self._timer = loop.call_later(self._max_delay, self._on_timer, send_callback)
+        if len(self._batch) >= self._max_size:
+            await self._deliver(send_callback, self._task)
+
+    def _on_timer(self, send_callback : Callable) -> None:
+        self._timer = None
+        self._task = _asyncio.get_running_loop().create_task(self._deliver(send_callback, self._task))
+
+    async def _deliver(self, send_callback : Callable, previous : Optional[_asyncio.Task] = None) -> None:
+        if previous is not None:
+            await previous
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        frames, self._batch = self._batch, []
+        if not frames:
+            return
+
+        msgs = [unpack(frame, fast_mode=True) for frame in frames]
+        if self._fields is None:
+            await self._callback(msgs, send_callback)
+        else:
+            columns = {'header.timestamp' : [m._header.timestamp for m in msgs],
+                       'header.src' : [m._header.src for m in msgs],
+                       'header.src_ent' : [m._header.src_ent for m in msgs]}
+            for field in self._fields:
+                columns[field] = [getattr(m, field, None) for m in msgs]
+            await self._callback(columns, send_callback)
+
+    async def flush(self, send_callback : Callable) -> None:
+        '''Delivers the batch if it is overdue (timers cannot fire while a blocking message bus waits for messages).'''
+        if self._batch and self._max_delay is not None and _asyncio.get_running_loop().time() - self._first >= self._max_delay:
+            await self._deliver(send_callback, self._task)
+
+    async def close(self, send_callback : Callable) -> None:
+        await self._deliver(send_callback, self._task)
+
+class _recorder:
+    '''Writes the frames of a record subscription to a log writer (see pyimclsts.lsf.log_writer).'''
+    __slots__ = ['_writer']
+
+    def __init__(self, writer : Any) -> None:
+        self._writer = writer
 
-    __slots__ = ['_msg_manager', '_subscriptions', '_subscripted_all', '_periodic', '_call_once', '_use_mp', '_peers', '_src2name', '_keep_running']
+    async def __call__(self, frame : bytes, send_callback : Callable) -> None:
+        self._writer.write(frame)
 
-    def __init__(self, IO_interface : _core.base_IO_interface, *,big_endian=False, use_mp = False) -> None:
+    async def flush(self, send_callback : Callable) -> None:
+        '''Lets the writer apply its time-based flush while the bus is idle.'''
+        self._writer.poll()
+
+    async def poll(self, send_callback : Callable) -> None:
+        '''Same as flush, but called periodically (see subscriber.record), since the bus may be idle for a long time.'''
+        self._writer.poll()
+
+    async def close(self, send_callback : Callable) -> None:
+        self._writer.close()
+
+class subscriber:
+
+    __slots__ = ['_msg_manager', '_subscriptions', '_subscripted_all', '_raw_subscriptions', '_raw_subscripted_all',
+                 '_unchecked_subscriptions', '_unchecked_subscripted_all', '_buffered',
+                 '_periodic', '_call_once', '_use_mp', '_peers', '_src2name', '_keep_running', '_mp_workers', '_process_pool',
+                 '_thread_workers', '_thread_pool', '_size_validator']
+
+    def __init__(self, IO_interface : _core.base_IO_interface, *,big_endian=False, use_mp = False, mp_workers : Optional[int] = None,
+                    thread_workers : Optional[int] = None, validate_size : bool = True) -> None:
+        '''mp_workers is the size of the process pool used by subscribe_mp (None = number of processors).
+        thread_workers is the size of the thread pool used by subscribe_thread (None = ThreadPoolExecutor's default).
+        With validate_size, frames whose payload size does not match the layout of their message (see schema.size_validator)
+        are dropped before they are deserialized, or handed to a subscription that deserializes them (subscribe_mp, 
+        subscribe_thread, etc.). Only subscribe_raw and record still receive them. See frame_statistics.'''
         self._use_mp = use_mp
         if self._use_mp:
             self._msg_manager = message_bus(IO_interface, big_endian)
@@ -492,9 +977,23 @@ class subscriber:
             self._msg_manager = message_bus_st(IO_interface, big_endian)
         self._subscriptions = dict()
         self._subscripted_all = []
+        # Subscriptions that receive the (CRC and size checked) frames as bytes, and deserialize them themselves.
+        self._raw_subscriptions = dict()
+        self._raw_subscripted_all = []
+        # Subscriptions that receive the (CRC checked) frames as bytes, before the size is checked (subscribe_raw, record).
+        self._unchecked_subscriptions = dict()
+        self._unchecked_subscripted_all = []
+        # Subscriptions that hold messages back and must be flushed (have .flush() and .close() coroutines)
+        self._buffered = []
         self._periodic = []
         self._call_once = []
 
+        self._mp_workers = mp_workers
+        self._process_pool = None
+        self._thread_workers = thread_workers
+        self._thread_pool = None
+        self._size_validator = _schema.size_validator(_pg) if validate_size else None
+
         # a dictionary of {vehicle name : {'src' : 1, 'entities' : { 1 : 'Entity name'...} ...}}
         # However, it can temporarily contains int keys denoting src to (temporarily) store information
         # of vehicles of unknown name
@@ -551,8 +1050,39 @@ class subscriber:
                     print(f'Warning: Given function {f} is neither Callable nor a coroutine.')
 
             while self._keep_running:
-                msg = msg_mgr.recv() if self._use_mp else await msg_mgr.recv()
+                # The bus has been drained: let the subscriptions that hold messages back deliver them.
+                if self._buffered and not msg_mgr.poll():
+                    await self._flush()
+
+                if self._use_mp:
+                    if not msg_mgr.poll():
+                        await self._wait_readable(msg_mgr)
+                    msg = msg_mgr.recv()
+                else:
+                    msg = await msg_mgr.recv()
                 mgid, src, src_ent = _get_id_src_src_ent(msg)
+                if mgid in self._unchecked_subscriptions:
+                    for f in self._unchecked_subscriptions[mgid]:
+                        if self._validate_call(src, src_ent, f[1], f[2]):
+                            await f[0](msg, msg_mgr.send)
+                for f in self._unchecked_subscripted_all:
+                    if self._validate_call(src, src_ent, f[1], f[2]):
+                        await f[0](msg, msg_mgr.send)
+
+                if self._size_validator is not None and not self._size_validator(mgid, len(msg) - 22, get_package(src) if _source_packages else None):
+                    if self._size_validator.rejected[mgid] == 1:
+                        print(f'Warning: Dropped a message (id {mgid}) whose size ({len(msg)} bytes) does not match its definition. '
+                                'Was it sent with another IMC version? Further occurrences are only counted (see frame_statistics).')
+                    continue
+
+                if mgid in self._raw_subscriptions:
+                    for f in self._raw_subscriptions[mgid]:
+                        if self._validate_call(src, src_ent, f[1], f[2]):
+                            await f[0](msg, msg_mgr.send)
+                for f in self._raw_subscripted_all:
+                    if self._validate_call(src, src_ent, f[1], f[2]):
+                        await f[0](msg, msg_mgr.send)
+
                 if mgid in self._subscriptions:
                     desel_message = unpack(msg, fast_mode=True)
                     for f in self._subscriptions[mgid]:
@@ -565,11 +1095,40 @@ class subscriber:
         except EOFError:
             print('Stream has ended.')
         finally:
+            for b in self._buffered:
+                await b.close(msg_mgr.send)
+            if self._process_pool is not None:
+                self._process_pool.shutdown()
+                self._process_pool = None
+            if self._thread_pool is not None:
+                self._thread_pool.shutdown()
+                self._thread_pool = None
             msg_mgr.close()
 
+    async def _wait_readable(self, msg_mgr : message_bus) -> None:
+        '''Waits until the pipe of the message bus has a message, while the event loop keeps running timers and 
+        background tasks (e.g., periodic_async). Event loops that cannot watch file descriptors (e.g., the proactor
+        of Windows) return at once, and recv blocks instead.'''
+        loop = _asyncio.get_running_loop()
+        fd = msg_mgr._parent_end.fileno()
+        ready = loop.create_future()
+        try:
+            loop.add_reader(fd, lambda : ready.done() or ready.set_result(None))
+        except NotImplementedError:
+            return
+        try:
+            await ready
+        finally:
+            loop.remove_reader(fd)
+
+    def frame_statistics(self) -> Optional[dict]:
+        '''Returns the number of received frames whose size was accepted and rejected, per message id (see 
+        schema.size_validator), or None if validate_size is disabled.'''
+        return self._size_validator.statistics() if self._size_validator is not None else None
+
     async def _abort(self, msg, send_callback):
         if msg._header is not None:
-            my_src = 0x4000 | (_core.get_initial_IP() & 0xFFFF)
+            my_src = _core.get_default_src()
             if msg._header.dst == my_src:
                 loop = _asyncio.get_running_loop()
                 loop.close()
@@ -578,7 +1137,8 @@ class subscriber:
         if msg._header is not None:
             src = msg._header.src
             
-            if isinstance(msg, _pg.messages.EntityList):
+            # (compared by abbrev, since messages of other sources may be of another package, see set_source_packages)
+            if msg.Attributes.abbrev == 'EntityList':
                 if msg.op == msg.OP.REPORT:
                     entList =  [i.split(sep='=') for i in msg.list.split(sep=';')]
                     entList = {k : int(v) for [k, v] in entList}
@@ -596,7 +1156,7 @@ class subscriber:
                         else:
                             self._peers[src] = {'EntityList' : entList}
             
-            elif isinstance(msg, _pg.messages.EntityInfo):
+            elif msg.Attributes.abbrev == 'EntityInfo':
                 name = self._src2name.get(src, None)
                 
                 if name is not None:
@@ -611,7 +1171,7 @@ class subscriber:
                     else:
                         self._peers[src] = {'EntityList' : {msg.label : msg.id}}
 
-            elif isinstance(msg, _pg.messages.Announce):
+            elif msg.Attributes.abbrev == 'Announce':
                 name = msg.sys_name
 
                 self._src2name[src] = name
@@ -657,7 +1217,50 @@ class subscriber:
             
         return False
     
-    def subscribe_async(self, callback : Callable[[_core.IMC_message, Callable[[_core.IMC_message], None]], None], msg_id : Optional[Union[int, _core.IMC_message, str, _types.ModuleType]] = None, *, src : Optional[str] = None, src_ent : Optional[str] = None):
+    def _get_process_pool(self) -> _futures.ProcessPoolExecutor:
+        if self._process_pool is None:
+            self._process_pool = _futures.ProcessPoolExecutor(max_workers=self._mp_workers)
+        return self._process_pool
+
+    def _get_thread_pool(self) -> _futures.ThreadPoolExecutor:
+        if self._thread_pool is None:
+            self._thread_pool = _futures.ThreadPoolExecutor(max_workers=self._thread_workers)
+        return self._thread_pool
+
+    def _get_msg_keys(self, msg_id : Optional[Union[int, _core.IMC_message, str, _types.ModuleType]]) -> Optional[List[int]]:
+        '''Translates the msg_id argument of the subscription methods to a list of message ids.
+        Returns None if msg_id is None, which is interpreted as 'all'.'''
+        if msg_id is None:
+            return None
+        elif isinstance(msg_id, _core.IMC_message):
+            return [msg_id.Attributes.id]
+        elif isinstance(msg_id, int):
+            return [msg_id]
+        elif _inspect.isclass(msg_id) and issubclass(msg_id, _core.IMC_message):
+            return [msg_id.Attributes.id]
+        elif isinstance(msg_id, str):
+            return self._get_msg_keys(getattr(_pg.categories, msg_id))
+        elif isinstance(msg_id, _types.ModuleType):
+            msgs = [j for j in [getattr(msg_id, i) for i in dir(msg_id) if _inspect.isclass(getattr(msg_id, i))] if issubclass(j, _core.IMC_message)]
+            return [m.Attributes.id for m in msgs]
+        
+        print(f'Warning: Given message id {msg_id} is not a known message.')
+        return []
+
+    def _add_subscription(self, subscriptions : dict, subscripted_all : list, msg_id : Optional[Union[int, _core.IMC_message, str, _types.ModuleType]], 
+                            c : Callable, src : Optional[str], src_ent : Optional[str]) -> None:
+        keys = self._get_msg_keys(msg_id)
+        if keys is None:
+            subscripted_all.append((c, src, src_ent))
+        else:
+            for key in keys:
+                if subscriptions.get(key, None) is not None:
+                    subscriptions[key].append((c, src, src_ent))
+                else:
+                    subscriptions[key] = [(c, src, src_ent)]
+
+    def subscribe_async(self, callback : Callable[[_core.IMC_message, Callable[[_core.IMC_message], None]], None], msg_id : Optional[Union[int, _core.IMC_message, str, _types.ModuleType]] = None, *, src : Optional[str] = None, src_ent : Optional[str] = None,
+                        max_rate : Optional[float] = None, every_nth : Optional[int] = None):
         '''Appends the callback to the list of subscriptions to a message.
         msg_id can be provided as an int, the class of the message, its instance or a category (string (camel case) or module).
         src and src_ent should be provided as strings.
@@ -677,59 +1280,150 @@ class subscriber:
 
         Tip: If the original function really needs arguments, wrap it with functools.partial.
         Tip2: Use a class instance to keep shared values across different calls. See followRef.py.
+
+        max_rate (in Hz) and every_nth decimate the subscription: for each (message id, src, src_ent), the callback
+        receives at most max_rate messages per second (according to the header timestamp) and/or only every n-th
+        message. They are evaluated on the message header, so the skipped messages are not even deserialized.
+        max_rate must be positive and every_nth a positive integer (ValueError otherwise).
         '''
-        key = None
-        if isinstance(msg_id, _core.IMC_message):
-            key = msg_id.Attributes.id
-        elif isinstance(msg_id, int):
-            key = msg_id
-        elif _inspect.isclass(msg_id):
-            if issubclass(msg_id, _core.IMC_message):
-                key = msg_id().Attributes.id
-        elif isinstance(msg_id, str):
-            module = getattr(_pg.categories, msg_id)
-            self.subscribe_async(callback, module, src=src, src_ent=src_ent)
-        elif isinstance(msg_id, _types.ModuleType):
-            msgs = [j for j in [getattr(msg_id, i) for i in dir(msg_id) if _inspect.isclass(getattr(msg_id, i))] if issubclass(j, _core.IMC_message)]
-            for m in msgs:
-                self.subscribe_async(callback, m, src=src, src_ent=src_ent)
-        elif msg_id is None:
-            pass
+        if max_rate is not None and not max_rate > 0:
+            raise ValueError(f'max_rate must be positive (got {max_rate}).')
+        if every_nth is not None and (not isinstance(every_nth, int) or every_nth < 1):
+            raise ValueError(f'every_nth must be a positive integer (got {every_nth}).')
+        c = None
+        if _inspect.iscoroutinefunction(callback):
+            c = callback
+        elif callable(callback):
+            c = _functools.partial(_core._async_wrapper, callback)
         else:
-            print(f'Warning: Given message id {msg_id} is not a known message.')
+            print(f'Warning: Given function {callback} is neither callable nor a coroutine.')
         
-        
-        # There is either an explicit subscription (the key is not None) or 'all'
-        # (msg_id is None). There cannot be both nor neither.
-        if (key is not None) ^ (msg_id is None):
-            c = None
-            if _inspect.iscoroutinefunction(callback):
-                c = callback
-            elif callable(callback):
-                c = _functools.partial(_core._async_wrapper, callback)
+        if c is not None:
+            if max_rate is not None or every_nth is not None:
+                c = _rate_gate(c, max_rate, every_nth)
+                self._add_subscription(self._raw_subscriptions, self._raw_subscripted_all, msg_id, c, src, src_ent)
             else:
-                print(f'Warning: Given function {callback} is neither callable nor a coroutine.')
-            
-            if c is not None:
-                if msg_id is None:
-                    self._subscripted_all.append((c, src, src_ent))
-                else:
-                    if self._subscriptions.get(key, None) is not None:
-                        self._subscriptions[key].append((c, src, src_ent))
-                    else:
-                        self._subscriptions[key] = [(c, src, src_ent)]
+                self._add_subscription(self._subscriptions, self._subscripted_all, msg_id, c, src, src_ent)
 
     def periodic_async(self, callback : Callable[[_core.IMC_message], None], period : float):
         '''Add callback to a list to be called every period seconds. Function must take
         a send callback as parameter. This callback can be used to send messages.'''
         self._periodic.append((callback, period))
 
-    def subscribe_mp(self, callback : Callable[[_core.IMC_message, Callable[[_core.IMC_message], None]], None], msg_id : Optional[Union[int, _core.IMC_message, str, _types.ModuleType]] = None, *, src : Optional[str] = None, src_ent : Optional[str] = None):
+    def subscribe_mp(self, callback : Callable[[_core.IMC_message, Callable[[_core.IMC_message], None]], None], msg_id : Optional[Union[int, _core.IMC_message, str, _types.ModuleType]] = None, *, src : Optional[str] = None, src_ent : Optional[str] = None,
+                        batch_size : int = 64, max_pending : int = 8):
         '''Calls a function and pass the message and a callback to send messages to it.
         Runs the given callback in a different process and should be used only with heavy load
         functions.
+
+        The frames (bytes, not message objects) are filtered in the main process and shipped in batches of
+        at most batch_size frames to a process pool (see mp_workers in the constructor), where they are
+        deserialized and given to the callback. Messages sent through the send callback are serialized in the
+        worker and written to the message bus by the main process. At most max_pending batches are in flight.
+
+        Since it must be sent to another process, the callback must be picklable, that is, a function defined
+        at module level (or a functools.partial of one). Any state kept by the callback lives in the worker
+        processes, which means that it is neither shared across workers nor with the main process, and the
+        callback may be called for different batches simultaneously.
         '''
-        raise NotImplemented
+        if not callable(callback):
+            print(f'Warning: Given function {callback} is neither callable nor a coroutine.')
+            return
+        c = _mp_batcher(callback, self._get_process_pool, self._msg_manager, batch_size, max_pending)
+        self._buffered.append(c)
+        self._add_subscription(self._raw_subscriptions, self._raw_subscripted_all, msg_id, c, src, src_ent)
+
+    def subscribe_thread(self, callback : Callable[[_core.IMC_message, Callable[[_core.IMC_message], None]], None], msg_id : Optional[Union[int, _core.IMC_message, str, _types.ModuleType]] = None, *, src : Optional[str] = None, src_ent : Optional[str] = None,
+                            max_queued : Optional[int] = 10000):
+        '''Same as subscribe_async, but the callback is executed in a thread pool (see thread_workers in the constructor),
+        so that it may block (file writes, database inserts, etc.) without stalling the event loop.
+
+        Each subscription is executed in order: the callback receives the messages in the order they were received and
+        is never called concurrently with itself. Different subscriptions may run concurrently, though.
+        The callback must be a regular function (not a coroutine). The send callback it receives can be safely
+        called from the worker thread.
+
+        At most max_queued messages wait for the callback (None = no limit, which lets a callback that is slower than
+        the stream use unbounded memory). When the limit is reached, the event loop stops reading the bus until the
+        callback has caught up.
+        '''
+        if _inspect.iscoroutinefunction(callback) or not callable(callback):
+            print(f'Warning: Given function {callback} is not a regular callable.')
+            return
+        c = _thread_dispatcher(callback, self._get_thread_pool, max_queued)
+        self._buffered.append(c)
+        self._add_subscription(self._raw_subscriptions, self._raw_subscripted_all, msg_id, c, src, src_ent)
+
+    def subscribe_latest(self, callback : Callable[[_core.IMC_message, Callable[[_core.IMC_message], None]], None], msg_id : Optional[Union[int, _core.IMC_message, str, _types.ModuleType]] = None, *, src : Optional[str] = None, src_ent : Optional[str] = None):
+        '''Same as subscribe_async, but conflating: for each (message id, src, src_ent), the subscription keeps only
+        the latest message. While the callback is busy, newer messages overwrite the pending ones and, when it is 
+        ready, it receives only the most recent one. Therefore, a slow consumer (e.g., a status display) never
+        falls behind the live stream, at the cost of skipping messages.
+
+        Coroutines are executed as a background task of the event loop. Regular functions are executed in the 
+        thread pool (see thread_workers in the constructor), whose send callback can be safely called from the
+        worker thread.
+        '''
+        if not callable(callback):
+            print(f'Warning: Given function {callback} is neither callable nor a coroutine.')
+            return
+        c = _conflator(callback, self._get_thread_pool)
+        self._buffered.append(c)
+        self._add_subscription(self._raw_subscriptions, self._raw_subscripted_all, msg_id, c, src, src_ent)
+
+    def subscribe_batch(self, callback : Callable[[Any, Callable[[_core.IMC_message], None]], None], msg_id : Optional[Union[int, _core.IMC_message, str, _types.ModuleType]] = None, *, src : Optional[str] = None, src_ent : Optional[str] = None,
+                        max_size : int = 1000, max_delay : Optional[float] = 1.0, fields : Optional[List[str]] = None):
+        '''Same as subscribe_async, but the callback receives the messages in batches, which amortizes the cost of calling it.
+        A batch is delivered when it has max_size messages or max_delay seconds (None = no limit) after its first message
+        was received. Any incomplete batch is delivered when the stream ends.
+
+        If fields is None, the callback receives a list of messages. Otherwise, it receives a dictionary of columns (lists), 
+        one per given field, plus 'header.timestamp', 'header.src' and 'header.src_ent', that can be directly converted to 
+        NumPy arrays or a pandas DataFrame. (Fields that a message does not have are filled with None.)
+        '''
+        c = None
+        if _inspect.iscoroutinefunction(callback):
+            c = callback
+        elif callable(callback):
+            c = _functools.partial(_core._async_wrapper, callback)
+        else:
+            print(f'Warning: Given function {callback} is neither callable nor a coroutine.')
+            return
+        c = _batcher(c, max_size, max_delay, fields)
+        self._buffered.append(c)
+        self._add_subscription(self._raw_subscriptions, self._raw_subscripted_all, msg_id, c, src, src_ent)
+
+    def subscribe_raw(self, callback : Callable[[bytes, Callable[[_core.IMC_message], None]], None], msg_id : Optional[Union[int, _core.IMC_message, str, _types.ModuleType]] = None, *, src : Optional[str] = None, src_ent : Optional[str] = None):
+        '''Same as subscribe_async, but the callback receives the frame (the serialized message, as bytes, exactly as 
+        it was received) instead of the deserialized message. Useful to forward or store messages without paying for 
+        their deserialization. Its size is not checked (see validate_size).'''
+        c = None
+        if _inspect.iscoroutinefunction(callback):
+            c = callback
+        elif callable(callback):
+            c = _functools.partial(_core._async_wrapper, callback)
+        else:
+            print(f'Warning: Given function {callback} is neither callable nor a coroutine.')
+            return
+        self._add_subscription(self._unchecked_subscriptions, self._unchecked_subscripted_all, msg_id, c, src, src_ent)
+
+    def record(self, writer : Any, msg_id : Optional[Union[int, _core.IMC_message, str, _types.ModuleType]] = None, *, src : Optional[str] = None, src_ent : Optional[str] = None):
+        '''Writes the received messages, as they were received, to a log writer (see pyimclsts.lsf.log_writer).
+        The writer is given the chance to flush its buffer whenever the bus has been drained and every flush_interval 
+        seconds of the writer, so that buffered messages are written even if the traffic stops. It is closed when the
+        subscriber stops.'''
+        c = _recorder(writer)
+        self._buffered.append(c)
+        interval = getattr(writer, '_flush_interval', None)
+        if interval is not None:
+            self.periodic_async(c.poll, interval)
+        self._add_subscription(self._unchecked_subscriptions, self._unchecked_subscripted_all, msg_id, c, src, src_ent)
+
+    async def _flush(self) -> None:
+        '''Forces the subscriptions that hold messages back (for example, subscribe_mp batches) to deliver them.
+        Called by the event loop whenever there are no messages waiting to be read.'''
+        for b in self._buffered:
+            await b.flush(self._msg_manager.send)
 
     def call_once(self, callback : Callable[[Callable[[_core.IMC_message], None]], None], delay : Optional[float] = None) -> None:
         '''Calls the given callbacks as soon as the main loop starts or according to their delay in seconds.
@@ -744,11 +1438,21 @@ class subscriber:
         
         _subscriptions_temp = self._subscriptions
         _subscripted_all_temp = self._subscripted_all
+        _raw_subscriptions_temp = self._raw_subscriptions
+        _raw_subscripted_all_temp = self._raw_subscripted_all
+        _unchecked_subscriptions_temp = self._unchecked_subscriptions
+        _unchecked_subscripted_all_temp = self._unchecked_subscripted_all
+        _buffered_temp = self._buffered
         _periodic_temp = self._periodic
         _call_once_temp = self._call_once
 
         self._subscriptions = dict()
         self._subscripted_all = []
+        self._raw_subscriptions = dict()
+        self._raw_subscripted_all = []
+        self._unchecked_subscriptions = dict()
+        self._unchecked_subscripted_all = []
+        self._buffered = []
         self._periodic = []
         self._call_once = []
 
@@ -757,9 +1461,9 @@ class subscriber:
         
         msgs = dict()
         def printmsg(msg, cb) -> None:
-            if isinstance(msg, _pg.messages.Announce):
+            if msg.Attributes.abbrev == 'Announce':
                 msgs['Announce'] = msg
-            if isinstance(msg, _pg.messages.EntityList) and msg.op == _pg.messages.EntityList.OP.REPORT:
+            if msg.Attributes.abbrev == 'EntityList' and msg.op == msg.OP.REPORT:
                 msgs['EntityList'] = msg
             if len(msgs) >= 2:
                 self.stop()
@@ -775,6 +1479,11 @@ class subscriber:
         
         self._subscriptions = _subscriptions_temp
         self._subscripted_all = _subscripted_all_temp
+        self._raw_subscriptions = _raw_subscriptions_temp
+        self._raw_subscripted_all = _raw_subscripted_all_temp
+        self._unchecked_subscriptions = _unchecked_subscriptions_temp
+        self._unchecked_subscripted_all = _unchecked_subscripted_all_temp
+        self._buffered = _buffered_temp
         self._periodic = _periodic_temp
         self._call_once = _call_once_temp
 
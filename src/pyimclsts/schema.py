@@ -0,0 +1,189 @@
+'''
+    Runtime description of the wire layout of the IMC messages.
+
+    The layout of a message is otherwise scattered across its Attributes, the _field_def of its
+    descriptors and the (un)pack functions of core. This module derives it once per message class:
+    field order, IMC types, sizes and offsets of the fixed fields, minimum (or exact) frame size and
+    the enumerations/bitfields of the fields. Codecs, log indexers and column extractors share it,
+    instead of re-deriving it for every message they handle.
+
+    Like core, it does not depend on a particular generated package: layouts are built from message
+    classes, and looking them up by id requires the package (e.g., pyimclsts.network._pg).
+'''
+
+import struct as _struct
+import sys as _sys
+import collections as _collections
+
+from typing import Any, Dict, List, Optional, Tuple
+
+# Size, in bytes, of the serialized IMC types whose size is fixed
+type_sizes = {'int8_t' : 1, 'uint8_t' : 1, 'int16_t' : 2, 'uint16_t' : 2, 'int32_t' : 4, 'uint32_t' : 4,
+                'int64_t' : 8, 'uint64_t' : 8, 'fp32_t' : 4, 'fp64_t' : 8}
+# Minimum size of the variable size types: the uint16_t length (rawdata, plaintext), id of the inline
+# message (0xFFFF when it is null) or number of messages (message-list)
+min_type_sizes = {'rawdata' : 2, 'plaintext' : 2, 'message' : 2, 'message-list' : 2}
+struct_codes = {'int8_t' : 'b', 'uint8_t' : 'B', 'int16_t' : 'h', 'uint16_t' : 'H', 'int32_t' : 'i', 'uint32_t' : 'I',
+                'int64_t' : 'q', 'uint64_t' : 'Q', 'fp32_t' : 'f', 'fp64_t' : 'd'}
+
+header_size = 20
+footer_size = 2
+
+class field_layout:
+    '''Layout of a field of a message.
+
+    size is None for variable size types, and offset (from the start of the payload) is None for
+    fields that follow a variable size field. enum is the IntEnum/IntFlag class of enumerated and
+    bitfield fields, and message_type the abbrev of the message of inline message(-list) fields, if
+    restricted.'''
+    __slots__ = ['name', 'type', 'size', 'offset', 'enum', 'message_type']
+
+    def __init__(self, name : str, type : str, size : Optional[int], offset : Optional[int], enum : Any, message_type : Optional[str]) -> None:
+        self.name = name
+        self.type = type
+        self.size = size
+        self.offset = offset
+        self.enum = enum
+        self.message_type = message_type
+
+    def __repr__(self) -> str:
+        return f'field_layout({self.name!r}, {self.type!r}, size={self.size}, offset={self.offset})'
+
+class message_layout:
+    '''Layout of a message (see get_layout).
+
+    The fields of a message are serialized in order, without padding. The leading fields of fixed size
+    (the "prefix") are at fixed offsets of the payload and can be unpacked at once (see prefix_struct).
+    A message is fixed when all its fields are; then payload_size and frame_size are exact, otherwise
+    they are the minimum sizes (all variable fields empty) and frame_size is None.'''
+    __slots__ = ['message_class', 'id', 'abbrev', 'fields', 'types', 'is_fixed', 'prefix', 'payload_size', 'min_frame_size',
+                    'frame_size', '_structs']
+
+    def __init__(self, message_class : Any) -> None:
+        self.message_class = message_class
+        self.id = message_class.Attributes.id
+        self.abbrev = message_class.Attributes.abbrev
+
+        fields = []
+        offset = 0
+        for name in message_class.Attributes.fields:
+            field_def = getattr(message_class, name)._field_def
+            t = field_def['type']
+            size = type_sizes.get(t, None)
+            fields.append(field_layout(name, t, size, offset, _field_enum(message_class, name, field_def), field_def.get('message-type', None)))
+            offset = offset + size if size is not None and offset is not None else None
+
+        self.fields = tuple(fields)
+        # (field name, IMC type), in order
+        self.types = tuple((f.name, f.type) for f in fields)
+        self.is_fixed = all(f.size is not None for f in fields)
+        self.prefix = next((i for i, f in enumerate(fields) if f.size is None), len(fields))
+        self.payload_size = sum(f.size if f.size is not None else min_type_sizes[f.type] for f in fields)
+        self.min_frame_size = header_size + self.payload_size + footer_size
+        self.frame_size = self.min_frame_size if self.is_fixed else None
+        self._structs = dict()
+
+    def prefix_struct(self, big_endian : bool) -> _struct.Struct:
+        '''Returns the Struct of the fixed size fields that start the payload (all of them, if the message is fixed).'''
+        s = self._structs.get(big_endian, None)
+        if s is None:
+            s = _struct.Struct(('>' if big_endian else '<') + ''.join(struct_codes[f.type] for f in self.fields[:self.prefix]))
+            self._structs[big_endian] = s
+        return s
+
+    def field(self, name : str) -> field_layout:
+        for f in self.fields:
+            if f.name == name:
+                return f
+        raise KeyError(f'{self.abbrev} has no field {name}.')
+
+    def __repr__(self) -> str:
+        size = f'frame_size={self.frame_size}' if self.is_fixed else f'min_frame_size={self.min_frame_size}'
+        return f'message_layout({self.abbrev}, {len(self.fields)} fields, {size})'
+
+def _field_enum(message_class : Any, name : str, field_def : dict) -> Any:
+    '''Same resolution as the descriptors: global definitions are in the enumerations/bitfields modules
+    of the package, local ones are nested in the message class, under the name of the field in uppercase.'''
+    unit = field_def.get('unit', None)
+    if unit not in ('Enumerated', 'Bitfield'):
+        return None
+    definition = field_def.get('enum-def' if unit == 'Enumerated' else 'bitfield-def', None)
+    if definition is None:
+        return getattr(message_class, name.upper(), None)
+    base = _sys.modules[message_class.__module__]._base
+    return getattr(base.imc_enums if unit == 'Enumerated' else base.imc_bitf, definition, None)
+
+# Message class -> layout
+_layouts : Dict[Any, message_layout] = dict()
+# (package name, message id) -> layout, or None for unknown ids
+_id_layouts : Dict[Tuple[str, int], Optional[message_layout]] = dict()
+
+def get_layout(message_class : Any) -> message_layout:
+    '''Returns the layout of a message class (or instance), computing it on the first call.'''
+    if not isinstance(message_class, type):
+        message_class = type(message_class)
+    layout = _layouts.get(message_class, None)
+    if layout is None:
+        layout = message_layout(message_class)
+        _layouts[message_class] = layout
+    return layout
+
+def get_layout_by_id(msg_id : int, package : Any) -> Optional[message_layout]:
+    '''Returns the layout of the message with the given id in the given generated package, or None if
+    the package does not define it. It only imports the category of the message.'''
+    key = (package.__name__, msg_id)
+    try:
+        return _id_layouts[key]
+    except KeyError:
+        abbrev = package.messages._message_ids.get(msg_id, None)
+        layout = get_layout(getattr(package.messages, abbrev)) if abbrev is not None else None
+        _id_layouts[key] = layout
+        return layout
+
+def get_layouts(package : Any) -> List[message_layout]:
+    '''Returns the layouts of all the messages of the package (imports all the categories).'''
+    return [get_layout_by_id(msg_id, package) for msg_id in package.messages._message_ids]
+
+class size_validator:
+    '''Checks the payload size of (CRC checked) frames against the layout of their message, before they are
+    deserialized: a fixed message must have exactly its size and a variable one at least its minimum size. 
+    Unknown messages are accepted (see network.unpack). The bounds of each message id are computed on its
+    first frame, so that the check is a dictionary lookup and two comparisons.
+
+    accepted counts the frames that passed and rejected, the frames that did not, per message id.'''
+    __slots__ = ['_package', '_bounds', '_package_bounds', 'accepted', 'rejected']
+
+    def __init__(self, package : Any) -> None:
+        self._package = package
+        # message id -> (min, max) payload size
+        self._bounds = dict()
+        # the same, of other packages (package name -> message id -> bounds)
+        self._package_bounds = dict()
+        self.accepted = 0
+        self.rejected = _collections.Counter()
+
+    def __call__(self, msg_id : int, size : int, package : Any = None) -> bool:
+        '''size is the payload size, i.e., the size field of the header (or the length of the frame minus 22). The
+        message is checked against the validator's package, unless another one is given (e.g., of another IMC version).'''
+        if package is None or package is self._package:
+            package = self._package
+            bounds_by_id = self._bounds
+        else:
+            bounds_by_id = self._package_bounds.setdefault(package.__name__, dict())
+        bounds = bounds_by_id.get(msg_id, None)
+        if bounds is None:
+            layout = get_layout_by_id(msg_id, package)
+            if layout is None:
+                bounds = (0, 0xFFFF)
+            else:
+                bounds = (layout.payload_size, layout.payload_size if layout.is_fixed else 0xFFFF)
+            bounds_by_id[msg_id] = bounds
+        if bounds[0] <= size <= bounds[1]:
+            self.accepted += 1
+            return True
+        self.rejected[msg_id] += 1
+        return False
+
+    def statistics(self) -> dict:
+        '''Returns {'accepted' : n, 'rejected' : {message id : n}}.'''
+        return {'accepted' : self.accepted, 'rejected' : dict(self.rejected)}
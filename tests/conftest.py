@@ -0,0 +1,49 @@
+'''
+    The tests use a package generated (once per session) from the IMC.xml of the repository, in a temporary
+    folder, which is exported to PYIMCLSTS_GENERATED before pyimclsts.network is imported.
+'''
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import pytest
+
+_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_folder = None
+
+def pytest_configure(config):
+    global _folder
+    _folder = tempfile.mkdtemp(prefix='pyimclsts-tests-')
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([os.path.join(_root, 'src'), os.environ.get('PYTHONPATH', '')]))
+    subprocess.run([sys.executable, '-m', 'pyimclsts.extract', '-x', os.path.join(_root, 'IMC.xml'), '-o', 'pyimc_generated'],
+                    cwd=_folder, env=env, check=True, stdout=subprocess.DEVNULL)
+    os.environ['PYIMCLSTS_GENERATED'] = os.path.join(_folder, 'pyimc_generated')
+
+def pytest_unconfigure(config):
+    if _folder is not None:
+        shutil.rmtree(_folder, ignore_errors=True)
+
+@pytest.fixture
+def generated_folder():
+    '''Folder of the generated package.'''
+    return os.environ['PYIMCLSTS_GENERATED']
+
+@pytest.fixture
+def pg():
+    import pyimclsts.network as network
+    return network._pg
+
+@pytest.fixture
+def make_frame(pg):
+    '''Returns a function that serializes a message, given by its abbrev, with the given header timestamp and source.
+    Fields that are not given are 0.'''
+    def make_frame(abbrev : str = 'EstimatedState', timestamp : float = 0.0, *, src : int = 0x4000, src_ent : int = 0xFF,
+                    big_endian : bool = False, **fields) -> bytes:
+        message_class = getattr(pg.messages, abbrev)
+        msg = message_class(**{f : fields.get(f, 0) for f in message_class.Attributes.fields})
+        msg._header = pg._base.header_data(sync=pg._base._sync_number, mgid=message_class.Attributes.id, size=0, timestamp=timestamp,
+                                            src=src, src_ent=src_ent, dst=0xFFFF, dst_ent=0xFF)
+        return msg.pack(is_big_endian=big_endian)
+    return make_frame
@@ -0,0 +1,163 @@
+import json
+import os
+import subprocess
+import sys
+import types
+import zipfile
+
+import pytest
+
+import pyimclsts.core as core
+import pyimclsts.lsf as lsf
+import pyimclsts.network as network
+
+def test_default_src(pg, make_frame):
+    # still available to code that used the module variable
+    assert pg._base._default_src == core.get_default_src()
+    msg = pg.messages.EstimatedState(**{f : 0 for f in pg.messages.EstimatedState.Attributes.fields})
+    assert network.unpack(msg.pack())._header.src == core.get_default_src()
+
+def test_lazy_import(tmp_path, make_frame):
+    # in a fresh interpreter, since the tests load the generated package
+    path = tmp_path / 'Data.lsf'
+    path.write_bytes(b''.join(make_frame(timestamp=1000.0 + i) for i in range(10)))
+    code = ('import pyimclsts.lsf as lsf, pyimclsts.network as network\n'
+            'assert type(network._pg) is network._lazy_package\n'
+            f'lsf.build_index({str(path)!r})\n'
+            'assert type(network._pg) is network._lazy_package\n')
+    src = os.path.dirname(os.path.dirname(network.__file__))
+    subprocess.run([sys.executable, '-c', code], env=dict(os.environ, PYTHONPATH=src), check=True)
+
+def _filled(pg, message_class, depth : int = 0):
+    '''An instance of the message class whose fields have distinct, non-zero values. Inline messages are alternately
+    null and set, message-lists have two messages.'''
+    msg = message_class(**{f : None for f in message_class.Attributes.fields})
+    for i, field in enumerate(message_class.Attributes.fields):
+        field_def = getattr(message_class, field)._field_def
+        datatype = field_def['type']
+        if datatype in ('message', 'message-list'):
+            # (the message-type can be an abstract message, e.g. RemoteData)
+            inner = getattr(pg.messages, field_def.get('message-type', ''), pg.messages.EstimatedState)
+            if datatype == 'message':
+                value = _filled(pg, inner, depth + 1) if depth == 0 and i % 2 == 0 else None
+            else:
+                value = [_filled(pg, inner, depth + 1) for _ in range(2)] if depth == 0 else []
+        elif datatype == 'rawdata':
+            value = bytes([i, 0xFE, 0x54])
+        elif datatype == 'plaintext':
+            value = f'field {i}'
+        elif datatype.startswith('fp'):
+            value = i + 0.25
+        elif datatype.startswith('int'):
+            value = -i - 1
+        else:
+            value = i + 1
+        setattr(msg, '_' + field, value)
+    return msg
+
+def test_generated_pack_fields(pg):
+    base = pg._base.base_message._pack_fields
+    for abbrev in pg.messages._message_ids.values():
+        msg = _filled(pg, getattr(pg.messages, abbrev))
+        # (the generated version is the one of the class)
+        assert type(msg)._pack_fields is not base, abbrev
+        for serial_functions in (core.pack_functions_big, core.pack_functions_little):
+            assert msg._pack_fields(serial_functions=serial_functions) == base(msg, serial_functions=serial_functions), abbrev
+
+def _extract(folder, *args) -> str:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=os.path.join(root, 'src'))
+    return subprocess.run([sys.executable, '-m', 'pyimclsts.extract', '-x', os.path.join(root, 'IMC.xml'), '-o', 'pyimc_generated', *args],
+                            cwd=folder, env=env, check=True, capture_output=True, text=True).stdout
+
+def test_extract_again(tmp_path):
+    _extract(tmp_path)
+    target = tmp_path / 'pyimc_generated'
+    # not generated: left untouched
+    (target / 'notes.py').write_text('x = 1\n')
+    (target / 'categories' / 'Custom.py').write_text('x = 1\n')
+    files = {path : path.stat().st_mtime_ns for path in target.rglob('*.py')}
+    assert target / 'categories' / 'Navigation.py' in files
+
+    assert 'up to date' in _extract(tmp_path)
+    assert {path : path.stat().st_mtime_ns for path in target.rglob('*.py')} == files
+
+    # (EstimatedState is not in the minimal set)
+    _extract(tmp_path, '--minimal')
+    assert not (target / 'categories' / 'Navigation.py').exists()
+    assert (target / 'notes.py').exists() and (target / 'categories' / 'Custom.py').exists()
+
+@pytest.fixture
+def old_package(tmp_path):
+    '''Folder of a package generated from an older IMC.xml, whose EstimatedState has no alt field.'''
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with open(os.path.join(root, 'IMC.xml'), 'rb') as f:
+        xml = f.read()
+    start = xml.index(b'abbrev="EstimatedState"')
+    field = xml.index(b'<field name="Altitude" abbrev="alt"', start)
+    assert field < xml.index(b'</message>', start)
+    xml = xml[:field] + xml[xml.index(b'</field>', field) + len(b'</field>'):]
+    (tmp_path / 'old').mkdir()
+    (tmp_path / 'old' / 'IMC.xml').write_bytes(xml)
+    _extract(tmp_path / 'old', '-x', 'IMC.xml')
+    return str(tmp_path / 'old' / 'pyimc_generated')
+
+_spawned = '''
+import multiprocessing
+import sys
+
+import pyimclsts.lsf as lsf
+import pyimclsts.network as network
+
+if __name__ == '__main__':
+    multiprocessing.set_start_method('spawn')
+    network.set_source_packages({2 : network.load_package(sys.argv[1])})
+    print(len(list(lsf.decode_parallel(sys.argv[2], workers=2, chunk_size=1000))))
+'''
+
+def test_source_packages(tmp_path, pg, make_frame, old_package):
+    old = network.load_package(old_package)
+    assert 'alt' not in old.messages.EstimatedState.Attributes.fields
+    data = bytearray()
+    for i in range(40):
+        if i % 2:
+            msg = old.messages.EstimatedState(**{f : 0 for f in old.messages.EstimatedState.Attributes.fields})
+            msg._header = old._base.header_data(sync=old._base._sync_number, mgid=msg.Attributes.id, size=0, timestamp=1000.0 + i,
+                                                src=2, src_ent=0xFF, dst=0xFFFF, dst_ent=0xFF)
+            msg.x = float(i)
+            data += msg.pack(is_big_endian=False)
+        else:
+            data += make_frame(timestamp=1000.0 + i, src=1, x=float(i))
+    path = tmp_path / 'Data.lsf'
+    path.write_bytes(bytes(data))
+    try:
+        network.set_source_packages({2 : old})
+        assert [msg.x for msg in lsf.iter_lsf(str(path))] == list(range(40))
+        assert [type(msg) for msg in lsf.iter_lsf(str(path), src=2)] == [old.messages.EstimatedState] * 20
+        # workers started from scratch find the packages by their location
+        assert json.loads(os.environ['PYIMCLSTS_SOURCE_PACKAGES']) == {'2' : old.__path__[0]}
+        script = tmp_path / 'spawned.py'
+        script.write_text(_spawned)
+        src = os.path.dirname(os.path.dirname(network.__file__))
+        out = subprocess.run([sys.executable, str(script), old_package, str(path)], env=dict(os.environ, PYTHONPATH=src),
+                                check=True, capture_output=True, text=True).stdout
+        assert out.split() == ['40']
+
+        with pytest.raises(ValueError):
+            network.set_source_packages({2 : types.ModuleType('not_a_package')})
+    finally:
+        network.set_source_packages({})
+
+def test_bundle(tmp_path, make_frame):
+    _extract(tmp_path, '--bundle')
+    bundle = str(tmp_path / 'pyimc_generated.zip')
+    with zipfile.ZipFile(bundle) as z:
+        names = z.namelist()
+    assert 'messages.py' in names and 'messages.pyc' in names and 'categories/Navigation.pyc' in names
+
+    package = network.load_package(bundle)
+    assert package.__path__[0] == bundle and network.load_package(bundle) is package
+    msg = network.unpack(make_frame(timestamp=1000.0, x=2.5), package=package)
+    assert type(msg) is package.messages.EstimatedState and msg.x == 2.5
+    # (imported by zipimport, from the bundle)
+    assert sys.modules[type(msg).__module__].__loader__.archive == bundle
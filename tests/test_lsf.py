@@ -0,0 +1,200 @@
+import gzip
+import os
+import random
+import time
+
+import pytest
+
+import pyimclsts.lsf as lsf
+
+_n_frames = 300
+
+def _fake_sync(size : int, big_endian : bool) -> bytes:
+    '''Sync number and header of an EstimatedState with the given payload size, without the rest of the frame.'''
+    byteorder = 'big' if big_endian else 'little'
+    return (0xFE54).to_bytes(2, byteorder) + (350).to_bytes(2, byteorder) + size.to_bytes(2, byteorder) + bytes(10)
+
+@pytest.fixture
+def corrupted_log(tmp_path, make_frame):
+    '''A log of EstimatedStates (x = 0, 1, ...), in both byte orders, with garbage between them: random bytes, truncated
+    frames (a sync number not followed by a valid CRC) and sync numbers whose size goes beyond the end of the log,
+    one of them a few frames before the end and another one after the last frame.'''
+    rng = random.Random(0)
+    data = bytearray()
+    for i in range(_n_frames):
+        frame = make_frame(timestamp=1000.0 + i, x=float(i), big_endian=(i % 3 == 0))
+        if i % 25 == 7:
+            data += bytes(rng.randrange(256) for _ in range(rng.randrange(1, 40)))
+        if i % 40 == 11:
+            data += frame[:30]
+        if i == _n_frames - 10:
+            data += _fake_sync(0xFFFF, big_endian=False)
+        data += frame
+    data += _fake_sync(0xFFF0, big_endian=True)
+    path = tmp_path / 'Data.lsf'
+    path.write_bytes(bytes(data))
+    return str(path)
+
+def _gzip_log(path : str) -> str:
+    with open(path, 'rb') as f, gzip.open(path + '.gz', 'wb') as g:
+        g.write(f.read())
+    return path + '.gz'
+
+@pytest.mark.parametrize('block_size', [1 << 20, 100])
+def test_reader_skips_garbage(corrupted_log, block_size):
+    with lsf.log_reader(corrupted_log, block_size=block_size) as reader:
+        assert [msg.x for msg in reader.messages()] == list(range(_n_frames))
+
+def test_mmap_reader_skips_garbage(corrupted_log):
+    with lsf.log_reader(corrupted_log, use_mmap=True) as reader:
+        assert [msg.x for msg in reader.messages()] == list(range(_n_frames))
+
+def test_gzip_reader_skips_garbage(corrupted_log):
+    with lsf.log_reader(_gzip_log(corrupted_log), block_size=100) as reader:
+        assert [msg.x for msg in reader.messages()] == list(range(_n_frames))
+
+def test_reader_keeps_position(corrupted_log):
+    with lsf.log_reader(corrupted_log, block_size=100) as reader:
+        frames = reader.frames()
+        first = [next(frames) for _ in range(10)]
+        rest = list(reader.frames())
+    assert len(first) + len(rest) == _n_frames
+
+def test_reader_filters(make_frame, tmp_path):
+    path = tmp_path / 'Filters.lsf'
+    path.write_bytes(b''.join(make_frame('Temperature' if i % 2 else 'EstimatedState', float(i), src=i % 3, value=1.0) for i in range(30)))
+    assert len(list(lsf.iter_lsf(str(path), msg_ids='Temperature'))) == 15
+    assert len(list(lsf.iter_lsf(str(path), src=[0, 1]))) == 20
+    assert all(msg._header.src == 2 for msg in lsf.iter_lsf(str(path), src=2))
+
+def test_index(corrupted_log):
+    index = lsf.build_index(corrupted_log)
+    assert len(index) == _n_frames
+    assert lsf.load_index(corrupted_log, build=False) is not None
+    with lsf.log_reader(corrupted_log, index=index) as reader:
+        assert [msg.x for msg in reader.messages()] == list(range(_n_frames))
+    with lsf.log_reader(corrupted_log, index=index, msg_ids='EstimatedState', src=0x4000) as reader:
+        assert len(list(reader.frames())) == _n_frames
+
+def test_stale_index(corrupted_log, make_frame):
+    lsf.build_index(corrupted_log)
+    with open(corrupted_log, 'ab') as f:
+        f.write(make_frame(timestamp=5000.0, x=float(_n_frames)))
+    assert lsf.load_index(corrupted_log, build=False) is None
+    assert len(lsf.load_index(corrupted_log)) == _n_frames + 1
+
+@pytest.mark.parametrize('mode', ['buffered', 'mmap', 'gzip', 'index'])
+def test_read_range(corrupted_log, mode):
+    path = _gzip_log(corrupted_log) if mode == 'gzip' else corrupted_log
+    index = lsf.build_index(path, save=False) if mode == 'index' else None
+    with lsf.log_reader(path, use_mmap=(mode == 'mmap'), index=index) as reader:
+        # the last frames follow a sync number whose size goes beyond the end of the log
+        assert [msg.x for msg in reader.read_range(1000.0 + _n_frames - 15, 1000.0 + _n_frames)] == list(range(_n_frames - 15, _n_frames))
+        assert [msg.x for msg in reader.read_range(1100.5, 1103.0)] == [101, 102]
+        reader.seek_time(5000.0)
+        assert list(reader.frames()) == []
+
+@pytest.mark.parametrize('mode', ['buffered', 'mmap', 'gzip', 'index'])
+def test_read_range_nested(tmp_path, make_frame, mode):
+    # large enough to be bisected (see lsf._seek_block), with relayed frames older than the frames around them
+    path = _nested_log(tmp_path / 'Nested.lsf', make_frame, 3000, 500.0)
+    path = _gzip_log(path) if mode == 'gzip' else path
+    index = lsf.build_index(path, save=False) if mode == 'index' else None
+    with lsf.log_reader(path, use_mmap=(mode == 'mmap'), index=index) as reader:
+        assert [msg.x for msg in reader.read_range(1000.0, 1005.0) if msg.Attributes.abbrev == 'EstimatedState'] == [0, 1, 2, 3, 4]
+        for t in [1500.0, 2345.0, 3999.0]:
+            reader.seek_time(t)
+            assert next(reader.messages()).x == t - 1000.0
+
+def _x(msg):
+    return msg.x
+
+def _nested_log(path, make_frame, n : int, relayed_time : float) -> str:
+    '''A log whose DevDataBinary messages carry (valid) EstimatedState frames, e.g., as relayed by a gateway.
+    Only a sequential reader knows that they are not frames of the log.'''
+    data = bytearray()
+    for i in range(n):
+        data += make_frame(timestamp=1000.0 + i, x=float(i))
+        data += make_frame('DevDataBinary', 1000.0 + i, value=bytes(40) + make_frame(timestamp=relayed_time + i, x=-1.0) + bytes(40))
+    path.write_bytes(bytes(data))
+    return str(path)
+
+@pytest.fixture
+def nested_log(tmp_path, make_frame):
+    return _nested_log(tmp_path / 'Nested.lsf', make_frame, 60, 2000.0)
+
+@pytest.mark.parametrize('chunk_size', [97, 250, 1000, 1 << 24])
+def test_decode_parallel(corrupted_log, nested_log, chunk_size):
+    for path in (corrupted_log, nested_log):
+        with lsf.log_reader(path) as reader:
+            frames = list(reader.frames())
+        assert list(lsf.decode_parallel(path, workers=2, chunk_size=chunk_size)) == frames
+    assert list(lsf.decode_parallel(nested_log, _x, msg_ids='EstimatedState', workers=2, chunk_size=chunk_size)) == list(range(60))
+    assert lsf.columns_parallel(nested_log, {'EstimatedState' : ['x']}, workers=2, chunk_size=chunk_size)['EstimatedState']['x'] == list(range(60))
+
+def test_extract_columns(corrupted_log, nested_log):
+    np = pytest.importorskip('numpy')
+    columns = lsf.extract_columns(corrupted_log, {'EstimatedState' : ['x', 'depth']})['EstimatedState']
+    assert list(columns) == ['header.timestamp', 'header.src', 'header.src_ent', 'x', 'depth']
+    assert np.array_equal(columns['x'], np.arange(_n_frames))
+    assert np.array_equal(columns['header.timestamp'], 1000.0 + np.arange(_n_frames))
+    assert len(lsf.extract_columns(corrupted_log, {'EstimatedState' : None}, src=1)['EstimatedState']['x']) == 0
+
+    # variable size messages are deserialized
+    columns = lsf.extract_columns(nested_log, {'DevDataBinary' : None, 'EstimatedState' : ['x']})
+    assert columns['DevDataBinary']['value'].dtype == object and len(columns['DevDataBinary']['value']) == 60
+    assert np.array_equal(columns['EstimatedState']['x'], np.arange(60))
+
+def test_column_cache(tmp_path, make_frame):
+    np = pytest.importorskip('numpy')
+    # larger than the samples of the digest (see lsf._log_digest)
+    frames = [make_frame(timestamp=1000.0 + i, x=float(i)) for i in range(25000)]
+    path = tmp_path / 'Data.lsf'
+    path.write_bytes(b''.join(frames))
+    assert np.array_equal(lsf.extract_columns(str(path), {'EstimatedState' : ['x']}, cache=True)['EstimatedState']['x'], np.arange(25000))
+    assert len(list((tmp_path / 'Data.lsf.cache').iterdir())) == 1
+
+    # edited in place, with the same size
+    frames[12500] = make_frame(timestamp=1000.0 + 12500, x=-1.0)
+    st = path.stat()
+    path.write_bytes(b''.join(frames))
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert lsf.extract_columns(str(path), {'EstimatedState' : ['x']}, cache=True)['EstimatedState']['x'][12500] == -1.0
+    # the columns of the previous version were removed
+    assert len(list((tmp_path / 'Data.lsf.cache').iterdir())) == 1
+
+def test_merge_logs(tmp_path, make_frame):
+    paths = []
+    for k in range(3):
+        path = tmp_path / f'{k}.lsf'
+        path.write_bytes(b''.join(make_frame(timestamp=float(t), src=k, x=float(t)) for t in range(k, 30, 3)))
+        paths.append(str(path))
+    merged = list(lsf.merge_logs(paths))
+    assert [msg.x for msg in merged] == list(range(30))
+    assert [msg._header.src for msg in merged[:4]] == [0, 1, 2, 0]
+    assert len(list(lsf.merge_logs(paths, src=1, raw=True))) == 10
+
+@pytest.mark.parametrize('compress', [False, True])
+def test_writer_rotation(tmp_path, make_frame, compress):
+    frames = [make_frame(timestamp=1000.0 + i, x=float(i)) for i in range(100)]
+    with lsf.log_writer(str(tmp_path / 'logs'), compress=compress, buffer_size=1000, max_size=30 * len(frames[0])) as writer:
+        for frame in frames:
+            writer.write(frame)
+    assert len(writer.paths) == 4
+    assert all(path.endswith('Data.lsf.gz' if compress else 'Data.lsf') for path in writer.paths)
+    assert [msg.x for path in writer.paths for msg in lsf.iter_lsf(path)] == list(range(100))
+
+def test_writer_flush(tmp_path, make_frame):
+    frame = make_frame(timestamp=1000.0)
+    writer = lsf.log_writer(str(tmp_path), buffer_size=10 * len(frame), flush_interval=0.05)
+    writer.write(frame)
+    assert os.path.getsize(writer.paths[0]) == 0
+    time.sleep(0.1)
+    writer.poll()
+    assert os.path.getsize(writer.paths[0]) == len(frame)
+    # full buffer
+    for _ in range(10):
+        writer.write(frame)
+    assert os.path.getsize(writer.paths[0]) >= 10 * len(frame)
+    writer.close()
+    assert os.path.getsize(writer.paths[0]) == 11 * len(frame)
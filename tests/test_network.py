@@ -0,0 +1,207 @@
+import asyncio
+import functools
+import os
+import threading
+import time
+
+import pytest
+
+import pyimclsts.core as core
+import pyimclsts.lsf as lsf
+import pyimclsts.network as network
+
+def _log(tmp_path, make_frame, n : int) -> str:
+    path = tmp_path / 'Data.lsf'
+    path.write_bytes(b''.join(make_frame(timestamp=1000.0 + i, x=float(i)) for i in range(n)))
+    return str(path)
+
+def test_subscribe_thread_back_pressure(tmp_path, make_frame, pg):
+    sub = network.subscriber(network.file_interface(input=_log(tmp_path, make_frame, 200)))
+    received = []
+    def slow(msg, send):
+        assert threading.current_thread() is not threading.main_thread()
+        # frames still waiting for the callback
+        received.append((msg.x, len(dispatcher._queue)))
+        time.sleep(0.001)
+    sub.subscribe_thread(slow, pg.messages.EstimatedState, max_queued=5)
+    dispatcher = sub._buffered[-1]
+    sub.run()
+    assert [x for x, _ in received] == list(range(200))
+    assert max(queued for _, queued in received) < 5
+
+class _idle_interface(core.base_IO_interface):
+    '''Delivers the given bytes, then no traffic for idle seconds, then the end of the stream.'''
+    def __init__(self, data : bytes, idle : float) -> None:
+        self._data = bytearray(data)
+        self._idle = idle
+
+    async def open(self) -> None:
+        pass
+
+    async def read(self, n_bytes : int) -> bytes:
+        if not self._data:
+            await asyncio.sleep(self._idle)
+            raise EOFError('End of the test stream')
+        r = bytes(self._data[:n_bytes])
+        del self._data[:n_bytes]
+        return r
+
+    async def write(self, byte_string : bytes) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+class _paced_interface(_idle_interface):
+    '''Delivers the given frames one at a time, every interval seconds, then the end of the stream.'''
+    def __init__(self, frames : list, interval : float) -> None:
+        self._frames = list(frames)
+        self._data = bytearray()
+        self._interval = interval
+
+    async def read(self, n_bytes : int) -> bytes:
+        if not self._data:
+            await asyncio.sleep(self._interval)
+            if not self._frames:
+                raise EOFError('End of the test stream')
+            self._data += self._frames.pop(0)
+        r = bytes(self._data[:n_bytes])
+        del self._data[:n_bytes]
+        return r
+
+class _recording_interface(_idle_interface):
+    '''Same as _idle_interface, but keeps what is written to it.'''
+    def __init__(self, data : bytes, idle : float) -> None:
+        super().__init__(data, idle)
+        self.written = []
+
+    async def write(self, byte_string : bytes) -> None:
+        self.written.append(byte_string)
+
+@pytest.mark.parametrize('use_mp', [False, True])
+def test_idle_recorder_flushes(tmp_path, make_frame, use_mp):
+    data = b''.join(make_frame(timestamp=1000.0 + i, x=float(i)) for i in range(20))
+    writer = lsf.log_writer(str(tmp_path), flush_interval=1.0)
+    sub = network.subscriber(_idle_interface(data, idle=3.0), use_mp=use_mp)
+    sub.record(writer)
+    on_disk = []
+    # (before the end of the stream, which closes the writer)
+    sub.call_once(lambda send : on_disk.append((os.path.getsize(writer.paths[0]), writer._file is not None)), delay=2.0)
+    sub.run()
+    # written while the bus was idle
+    assert on_disk == [(len(data), True)]
+
+def test_thread_dispatcher_close():
+    async def main():
+        dispatcher = network._thread_dispatcher(None, None, None)
+        # a job that has finished, whose done callback has not been executed yet
+        job = asyncio.get_running_loop().create_future()
+        dispatcher._job = job
+        job.add_done_callback(functools.partial(dispatcher._done, None))
+        job.set_result(None)
+        await dispatcher.close(None)
+        assert dispatcher._job is None
+    asyncio.run(main())
+
+def _resized(frame : bytes, payload_size : int) -> bytes:
+    '''The (little endian) frame with its payload truncated or padded to the given size, with a valid CRC.'''
+    payload = frame[20:-2][:payload_size].ljust(payload_size, b'\0')
+    data = frame[:4] + payload_size.to_bytes(2, 'little') + frame[6:20] + payload
+    return data + core.CRC16IMB(data).to_bytes(2, 'little')
+
+def test_size_validation(tmp_path, make_frame, pg):
+    frames = [make_frame(timestamp=1000.0 + i, x=float(i)) for i in range(20)]
+    frames[5] = _resized(frames[5], 10)
+    frames[12] = _resized(frames[12], len(frames[12]) - 22 + 8)
+    path = tmp_path / 'Data.lsf'
+    path.write_bytes(b''.join(frames))
+    sub = network.subscriber(network.file_interface(input=str(path)))
+    received = {k : [] for k in ['async', 'rate', 'thread', 'latest', 'batch', 'raw']}
+    EstimatedState = pg.messages.EstimatedState
+    sub.subscribe_async(lambda msg, send : received['async'].append(msg.x), EstimatedState)
+    sub.subscribe_async(lambda msg, send : received['rate'].append(msg.x), EstimatedState, every_nth=1)
+    sub.subscribe_thread(lambda msg, send : received['thread'].append(msg.x), EstimatedState)
+    sub.subscribe_latest(lambda msg, send : received['latest'].append(msg.x), EstimatedState)
+    sub.subscribe_batch(lambda batch, send : received['batch'].extend(msg.x for msg in batch), EstimatedState)
+    sub.subscribe_raw(lambda frame, send : received['raw'].append(frame), EstimatedState)
+    sub.run()
+    expected = [float(i) for i in range(20) if i not in (5, 12)]
+    for k in ['async', 'rate', 'thread', 'batch']:
+        assert received[k] == expected, k
+    assert received['latest'] and set(received['latest']) <= set(expected)
+    assert received['raw'] == frames
+    assert sub.frame_statistics()['rejected'] == {EstimatedState.Attributes.id : 2}
+
+def test_rate_limit(tmp_path, make_frame, pg):
+    data = bytearray()
+    # 10 Hz from two sources, during 3 seconds
+    for i in range(30):
+        for src in (1, 2):
+            data += make_frame(timestamp=1000.0 + i / 10, src=src, x=float(i))
+    path = tmp_path / 'Data.lsf'
+    path.write_bytes(bytes(data))
+    sub = network.subscriber(network.file_interface(input=str(path)))
+    received = {'rate' : [], 'nth' : []}
+    sub.subscribe_async(lambda msg, send : received['rate'].append((msg._header.src, msg.x)), pg.messages.EstimatedState, max_rate=2.0)
+    sub.subscribe_async(lambda msg, send : received['nth'].append((msg._header.src, msg.x)), pg.messages.EstimatedState, every_nth=4)
+    sub.run()
+    # (per source)
+    assert received['rate'] == [(src, float(i)) for i in range(0, 30, 5) for src in (1, 2)]
+    assert received['nth'] == [(src, float(i)) for i in range(0, 30, 4) for src in (1, 2)]
+
+    for kwargs in [{'max_rate' : 0}, {'max_rate' : -1.0}, {'every_nth' : 0}, {'every_nth' : -2}, {'every_nth' : 1.5}]:
+        with pytest.raises(ValueError):
+            sub.subscribe_async(lambda msg, send : None, pg.messages.EstimatedState, **kwargs)
+
+def test_subscribe_batch(make_frame, pg):
+    frames = [make_frame(timestamp=1000.0 + i, src=i % 2, x=float(i)) for i in range(40)]
+    sub = network.subscriber(_paced_interface(frames, interval=0.01))
+    batches = []
+    busy = []
+    async def slow(batch, send):
+        # deliveries must not overlap
+        assert not busy
+        busy.append(True)
+        batches.append(batch)
+        await asyncio.sleep(0.1)
+        busy.pop()
+    sub.subscribe_batch(slow, pg.messages.EstimatedState, max_size=8, max_delay=0.05)
+    columns = []
+    sub.subscribe_batch(lambda batch, send : columns.append(batch), pg.messages.EstimatedState, max_size=10, max_delay=None, fields=['x', 'depth'])
+    sub.run()
+
+    assert [msg.x for batch in batches for msg in batch] == list(range(40))
+    # both triggers: the delay (while the callback is busy, messages keep arriving) and the size
+    assert 1 < len(batches) < 40 and max(len(batch) for batch in batches) == 8 and min(len(batch) for batch in batches) < 8
+    assert [list(batch) for batch in columns] == [['header.timestamp', 'header.src', 'header.src_ent', 'x', 'depth']] * 4
+    assert columns[1]['x'] == list(range(10, 20))
+    assert columns[1]['header.src'] == [0, 1] * 5
+    assert columns[1]['header.timestamp'] == [1000.0 + i for i in range(10, 20)]
+
+def test_subscribe_latest(make_frame, pg):
+    frames = [make_frame(timestamp=1000.0 + i, src=i % 2, x=float(i)) for i in range(60)]
+    sub = network.subscriber(_paced_interface(frames, interval=0.005))
+    received = []
+    async def slow(msg, send):
+        received.append((msg._header.src, msg.x))
+        await asyncio.sleep(0.05)
+    sub.subscribe_latest(slow, pg.messages.EstimatedState)
+    sub.run()
+    # messages that arrived while the callback was busy were replaced by the latest one of their source
+    assert 2 < len(received) < 30
+    for src in (0, 1):
+        xs = [x for s, x in received if s == src]
+        assert xs == sorted(xs) and xs[-1] == 58 + src
+
+def _echo(parent : int, msg, send):
+    if os.getpid() != parent:
+        send(network._pg.messages.Temperature(value=msg.x))
+
+def test_subscribe_mp(make_frame, pg):
+    interface = _recording_interface(b''.join(make_frame(timestamp=1000.0 + i, x=float(i)) for i in range(50)), idle=1.5)
+    sub = network.subscriber(interface, mp_workers=2)
+    sub.subscribe_mp(functools.partial(_echo, os.getpid()), pg.messages.EstimatedState, batch_size=8)
+    sub.run()
+    # sent from the workers, written to the bus by the main process
+    sent = [network.unpack(frame) for frame in interface.written]
+    assert sorted(msg.value for msg in sent if msg.Attributes.abbrev == 'Temperature') == list(range(50))
@@ -0,0 +1,45 @@
+import pyimclsts.schema as schema
+
+def _empty(message_class):
+    '''An instance of the message class of minimum size: variable size fields are empty.'''
+    values = {'rawdata' : b'', 'plaintext' : '', 'message' : None, 'message-list' : []}
+    msg = message_class(**{f : None for f in message_class.Attributes.fields})
+    for f in schema.get_layout(message_class).fields:
+        setattr(msg, '_' + f.name, values.get(f.type, 0))
+    return msg
+
+def test_layouts(pg, make_frame):
+    layouts = schema.get_layouts(pg)
+    assert len(layouts) == len(pg.messages._message_ids)
+    for layout in layouts:
+        msg = _empty(layout.message_class)
+        frame = msg.pack(is_big_endian=False)
+        assert len(frame) == layout.min_frame_size, layout.abbrev
+        assert layout.frame_size == (len(frame) if layout.is_fixed else None)
+        assert all(f.offset is None for f in layout.fields[layout.prefix:][1:])
+
+    layout = schema.get_layout(pg.messages.EstimatedState)
+    # (after lat, lon and height)
+    assert layout.is_fixed and layout.field('x').offset == 20 and layout.field('x').type == 'fp32_t'
+    for big_endian in (True, False):
+        frame = make_frame(x=3.5, depth=-2.0, big_endian=big_endian)
+        values = layout.prefix_struct(big_endian).unpack(frame[schema.header_size:-schema.footer_size])
+        assert dict(zip(pg.messages.EstimatedState.Attributes.fields, values))['x'] == 3.5
+        assert values[[f.name for f in layout.fields].index('depth')] == -2.0
+    assert schema.get_layout_by_id(0xFFF0, pg) is None
+
+def test_size_validator(pg):
+    validator = schema.size_validator(pg)
+    fixed = schema.get_layout(pg.messages.EstimatedState)
+    variable = schema.get_layout(pg.messages.LogBookEntry)
+    assert not variable.is_fixed
+
+    assert validator(fixed.id, fixed.payload_size)
+    assert not validator(fixed.id, fixed.payload_size - 1)
+    assert not validator(fixed.id, fixed.payload_size + 1)
+    assert validator(variable.id, variable.payload_size)
+    assert validator(variable.id, variable.payload_size + 100)
+    assert not validator(variable.id, variable.payload_size - 1)
+    # unknown messages are left to unpack
+    assert validator(0xFFF0, 3)
+    assert validator.statistics() == {'accepted' : 4, 'rejected' : {fixed.id : 2, variable.id : 1}}